@@ -9,9 +9,18 @@ import os
 
 from pathlib import Path
 from datetime import datetime
-from gspread_dataframe import set_with_dataframe
-from scripts.data_pipeline import generate_and_save_snapshot, update_data, get_google_sheet
-from scripts.utils import get_seller_names, to_excel,relative_date
+from scripts.data_pipeline import PipelineContext, generate_and_save_snapshot, update_data, get_google_sheet
+from scripts.utils import get_seller_names
+from scripts.order_store import get_order_store
+from scripts.sheets import get_worksheet
+from scripts.sheet_sync import SheetSync
+from scripts.rfv_core import typed_snapshot
+from scripts.snapshot_cache import load_snapshot, save_snapshot_version
+from scripts.dashboard_views import EXCLUDED_CNPJS, archive_filters, build_view, export_name, search_mask, snapshot_id
+from scripts.exports import EXPORT_FORMATS, export_file, prune_exports, read_export
+from scripts import metrics
+from scripts.jobs import ACTIVE_STATUSES, latest_job, start_job
+from scripts.snapshot_archive import archive_version, archived_days, churn_flow, transition_matrix
 
 # Page config
 st.set_page_config(page_title="RFV WhatsApp", layout="wide")
@@ -30,249 +39,341 @@ if password != st.secrets["APP_PASSWORD"]:
     st.stop()
 st.success("✅ Acesso liberado!")
 
-# ✅ Session state setup
-if "snapshot_df" not in st.session_state:
-    st.session_state.snapshot_df = pd.DataFrame()
+# 📏 Each rerun after login is measured (scripts/metrics.py); ?diagnostico=1 shows the panel.
+# The with block also closes the stage when st.stop()/st.rerun() end the script early.
+metrics.new_run("painel")
+with metrics.stage("dashboard_rerun") as rerun:
+    # ✅ Session state setup
+    if "snapshot_df" not in st.session_state:
+        st.session_state.snapshot_df = pd.DataFrame()
 
-if "pagination" not in st.session_state:
-    st.session_state.pagination = {}
+    if "pagination" not in st.session_state:
+        st.session_state.pagination = {}
 
-PAGE_SIZE = 10
+    PAGE_SIZE = 10
 
-today = datetime.today()
-snapshot_day = (datetime.today().replace(day=1) - pd.Timedelta(days=1)).date()
-snapshot_title = f"rfm_snapshot_{snapshot_day:%Y_%m_%d}"
 
-if st.session_state.snapshot_df.empty:
-    try:
-        sheet = get_google_sheet()  
-        ws = sheet.worksheet(snapshot_title)
-        df = pd.DataFrame(ws.get_all_records())
-        st.session_state.snapshot_df = df
-        st.success(f"✅ RFM DO DIA {snapshot_day:%d-%m-%Y} CARREGADA COM SUCESSO")
+    # 🧠 Views cached per (snapshot id, seller): filters, sorted segment frames and chart data are
+    # built once; the snapshot frame itself is not hashed (leading underscore), its id is the key
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def cached_view(snapshot_key, seller, active_sellers, day, _df):
+        return build_view(_df, seller, list(active_sellers))
 
-    except Exception as e:
-        st.warning(f"⚠️ Snapshot do mês ainda não existe. Gere manualmente. Erro: {e}")
 
-        with st.expander("⚙️ Operações Manuais", expanded=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("🔄 Atualizar pedidos e clientes"):
-                    with st.spinner("🔄 Atualizando dados..."):
-                        update_data()
-                    st.success("✅ Dados atualizados com sucesso.")
-            with col2:
-                if st.button("📊 Gerar snapshot manual"):
-                    with st.spinner("📊 Gerando snapshot mensal..."):
-                        df = generate_and_save_snapshot()
-                        st.session_state.snapshot_df = df
-                    st.success("✅ Snapshot gerado com sucesso.")
-        st.stop()
-else:
-    df = st.session_state.snapshot_df
-    # 🚫 Excluir NUVEMSHOP e CNPJ = 1
-    df = df[(df["seller_name"] != "NUVEMSHOP") & (df["cnpj"] != 1)]
-
-active_sellers, inactive_sellers = get_seller_names()
-seller_options = ["Todas"] + active_sellers + (["Sem vendedora"] if inactive_sellers else ["Sem vendedora"])
-selected_seller = st.selectbox("Filtrar por vendedora:", seller_options)
-
-if selected_seller == "Sem vendedora":
-    df = df[~df["seller_name"].isin(active_sellers)]
-elif selected_seller != "Todas":
-    df = df[df["seller_name"] == selected_seller]
-
-df = df[df["cnpj"].notna()]
-df = df[df["value"] > 0]
-
-st.subheader("📨 Marcação de mensagens por segmento")
-rfv_groups = {
-    "🏆 Campeões de vendas": ["Campeões", "Leais"],
-    "🔄 Potenciais vendas": ["Potenciais Leais", "Recentes", "Promissores", "Precisam Atenção", "Não pode perdê-los"],
-    "⚠️ Atenção": ["Em risco", "Prestes a dormir", "Hibernando"],
-    "❄️ Perdidos": ["Perdidos"]
-}
-
-updated_rows = []
-
-for title, segments in rfv_groups.items():
-    group_df = df[df["m0_rfm"].isin(segments)].copy()
-    group_df["original_index"] = group_df.index
-    group_df = group_df.sort_values(by="last_purchase_date", ascending=False)
-    total_rows = len(group_df)
-    max_page = (total_rows - 1) // PAGE_SIZE
-    page_key = f"page_{title}"
-    if page_key not in st.session_state.pagination:
-        st.session_state.pagination[page_key] = 0
-
-    with st.expander(f"{title}", expanded=True):
-        st.markdown(f"({total_rows} clientes)")
-
-        current_page = st.session_state.pagination[page_key]
-        start = current_page * PAGE_SIZE
-        end = start + PAGE_SIZE
-        paginated_df = group_df.iloc[start:end]
-
-        edited_df = paginated_df.copy() # Paginate
-        edited_df["Enviado?"] = edited_df["message_sent"]  # Default unchecked
-
-        # Format value to "1.250" instead of "1,250.00"
-        edited_df["Valor (R$)"] = edited_df["value"].apply(lambda v: f"R$ {int(round(v)):,}".replace(",", "."))
-
-        # Convert to datetime if not already
-        edited_df["first_purchase_date"] = pd.to_datetime(edited_df["first_purchase_date"], errors="coerce")
-        edited_df["last_purchase_date"] = pd.to_datetime(edited_df["last_purchase_date"], errors="coerce")
-        edited_df["1ª compra"] = edited_df["first_purchase_date"].apply(relative_date)
-        edited_df["Última compra"] = edited_df["last_purchase_date"].apply(relative_date)
-
-        # Check all toggle
-        check_all = st.checkbox("✔️ Selecionar todos os 10", key=f"check_all_{title}")
-        if check_all:
-            edited_df["message_sent"] = True
-
-        # Change display name
-        edited_df_display = edited_df[[
-            "name", "cnpj", "seller_name", "recency", "frequency", "Valor (R$)",
-            "1ª compra", "Última compra", "m0_rfm", "m1_rfm", "Enviado?"
-        ]].rename(columns={
-            "name": "Cliente", "cnpj": "CNPJ", "seller_name": "Vendedora",
-            "recency": "Recência", "frequency": "Frequência",
-            "m0_rfm": "RFM atual", "m1_rfm": "RFM (M-1)","message_sent":"Enviado?"
-        })
-
-        # COLUMNS TO SHOW
-        edited_df_display = st.data_editor(
-            edited_df_display,
-            key=f"editor_{title}",
-            use_container_width=True,
-            hide_index=True,
-            num_rows="dynamic",
-            column_order=[
-                "Cliente", "CNPJ", "Vendedora", "Recência", "Frequência", "Valor (R$)",
-                "1ª compra", "Última compra", "Snapshot", "RFM Mês 0", "RFM Mês 1", "Enviado?"
-            ]
-        )
-        edited_with_cnpj = edited_df_display.merge(
-            paginated_df[["cnpj", "original_index"]],
-            how="left",
-            left_on="CNPJ",
-            right_on="cnpj"
-        )
+    # Archive queries cached per archive version (changes whenever a month is archived)
+    @st.cache_data(max_entries=32, show_spinner=False)
+    def cached_migration(archive_key, from_day, to_day, seller, excluded_sellers):
+        excluded_sellers = list(excluded_sellers)
+        matrix = transition_matrix(from_day, to_day, seller, excluded_sellers, EXCLUDED_CNPJS)
+        flow = churn_flow(12, seller, excluded_sellers, EXCLUDED_CNPJS)
+        return matrix, flow
 
-        for _, row in edited_with_cnpj.iterrows():
-            if row["Enviado?"]:
-                updated_rows.append((row["original_index"], True))
 
-        col1, col2 = st.columns([1, 6])
-        with col1:
-            if current_page > 0:
-                if st.button("⬅️ Anterior", key=f"prev_{title}"):
-                    st.session_state.pagination[page_key] -= 1
-        with col2:
-            if current_page < max_page:
-                if st.button("Próximo ➡️", key=f"next_{title}"):
-                    st.session_state.pagination[page_key] += 1
+    today = datetime.today()
+    snapshot_day = (datetime.today().replace(day=1) - pd.Timedelta(days=1)).date()
+    snapshot_title = f"rfm_snapshot_{snapshot_day:%Y_%m_%d}"
 
 
-# SAVE CHECKS TO GOOGLE SHEETS
-if updated_rows:
-    if st.button("📅 Salvar marcações de mensagem"):
-        for idx, is_checked in updated_rows:
-            df.at[idx, "message_sent"] = is_checked
+    # 🧵 Background refresh jobs (scripts/jobs.py)
+    def update_job(progress):
+        update_data(PipelineContext(progress))
 
-        try:
-            sheet = get_google_sheet()
-            ws = sheet.worksheet(snapshot_title)
-            set_with_dataframe(ws, df)
-            st.success("✅ Marcações salvas e sincronizadas com o Google Sheet!")
-        except Exception as e:
-            st.error(f"❌ Erro ao salvar no Google Sheet: {e}")
-
-rfm_order = [
-    "Campeões", "Leais", "Potenciais Leais", "Recentes", "Promissores",
-    "Precisam Atenção", "Não pode perdê-los", "Em risco", 
-    "Prestes a dormir", "Hibernando", "Perdidos"
-]
-segment_counts = df['m0_rfm'].value_counts().reindex(rfm_order).fillna(0).astype(int)
-df_plot = pd.DataFrame({
-    "Segmento": segment_counts.index,
-    "Clientes": segment_counts.values
-})
-df_plot["% do total"] = (df_plot["Clientes"] / df_plot["Clientes"].sum() * 100).round(0)
-
-fig = px.bar(
-    df_plot,
-    x="Segmento",
-    y="Clientes",
-    color="Segmento",
-    text="% do total",
-    color_discrete_sequence=px.colors.qualitative.Safe,
-    labels={"Clientes": "Nº de Clientes"},
-    title="📊 Nº de Clientes por Segmento RFM"
-)
-fig.update_traces(texttemplate='%{text}%', textposition='outside')
-fig.update_layout(
-    xaxis_tickangle=-45,
-    yaxis=dict(showgrid=True, gridcolor="lightgrey"),
-    plot_bgcolor='white',
-    showlegend=False
-)
-st.plotly_chart(fig, use_container_width=True)
-
-st.subheader("⬇️ Exportar")
-st.download_button(
-    label="📥 Baixar CSV",
-    data=df.to_csv(index=False),
-    file_name="rfv_clientes.csv",
-    mime="text/csv",
-    key="csv_download_button"
-)
-
-st.download_button(
-    label="📥 Baixar Excel",
-    data=to_excel(df),
-    file_name="rfv_clientes.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    key="excel_download_button"
-)
-
-
-
-# 🔗 Link to open the Google Sheet (styled like a button)
-try:
-    sheet = get_google_sheet()
-    sheet_url = sheet.url
-
-    st.markdown(
-        f"""
-        <a href="{sheet_url}" target="_blank">
-            <button style="
-                background-color: #4CAF50;
-                color: white;
-                padding: 0.5em 1.5em;
-                border: none;
-                border-radius: 4px;
-                font-size: 16px;
-                cursor: pointer;
-                margin-top: 1em;
-            ">
-                📄 Abrir no Google Sheets
-            </button>
-        </a>
-        """,
-        unsafe_allow_html=True
-    )
 
-except Exception as e:
-    st.warning(f"⚠️ Não foi possível gerar o link do Google Sheet: {e}")
+    def snapshot_job(progress):
+        if generate_and_save_snapshot(PipelineContext(progress)).empty:
+            raise RuntimeError("snapshot vazio (ver log do servidor)")
+
+
+    @st.fragment(run_every=2)
+    def job_panel():
+        job = latest_job()
+        if job is None:
+            return
+        label = {"update": "Atualização de pedidos e clientes", "snapshot": "Geração do snapshot"}.get(job["kind"], job["kind"])
+        if job["status"] in ACTIVE_STATUSES:
+            if job["total"]:
+                st.progress(job["done"] / job["total"], text=f"⏳ {label} – {job['stage']}: {job['done']}/{job['total']} ({job['detail']})")
+            else:
+                st.info(f"⏳ {label}: {job['status']} desde {job['started_at'] or job['created_at']}")
+            st.session_state.watched_job = job["id"]
+            return
+
+        if job["status"] == "concluído":
+            st.success(f"✅ {label} concluída em {job['finished_at']}.")
+        else:
+            st.error(f"❌ {label}: {job['status']} {job['error'] or ''}")
+        # A snapshot job that just finished: reload the whole page to pick the snapshot up
+        if st.session_state.pop("watched_job", None) == job["id"] and job["kind"] == "snapshot" and job["status"] == "concluído":
+            st.rerun()
 
 
+    # Snapshot kept in the typed schema (categories, small ints, datetimes) for the whole session
+    def set_snapshot(df):
+        df = typed_snapshot(df)
+        st.session_state.snapshot_df = df
+        st.session_state.snapshot_id = snapshot_id(snapshot_title, df)
+        prune_exports(st.session_state.snapshot_id)
 
 
+    if st.session_state.snapshot_df.empty:
+        try:
+            # Local Parquet copy when its version matches the sheet's, otherwise the sheet itself
+            with metrics.stage("dashboard_load") as step:
+                set_snapshot(load_snapshot(snapshot_title))
+                step.rows = len(st.session_state.snapshot_df)
+            st.success(f"✅ RFM DO DIA {snapshot_day:%d-%m-%Y} CARREGADA COM SUCESSO")
 
+        except Exception as e:
+            st.warning(f"⚠️ Snapshot do mês ainda não existe. Gere manualmente. Erro: {e}")
+
+            with st.expander("⚙️ Operações Manuais", expanded=True):
+                last_order = get_order_store().last_order_date()
+                st.caption(f"📦 Último pedido no banco local: {last_order:%d-%m-%Y}" if last_order else "📦 Banco local de pedidos vazio.")
+                col1, col2 = st.columns(2)
+                # Jobs run in a background thread (one at a time, shared with the scheduled CLI job);
+                # the panel below polls their progress
+                with col1:
+                    if st.button("🔄 Atualizar pedidos e clientes"):
+                        job_id, started = start_job("update", update_job)
+                        if not started:
+                            st.info("ℹ️ Já existe uma atualização em andamento; acompanhando o progresso.")
+                with col2:
+                    if st.button("📊 Gerar snapshot manual"):
+                        job_id, started = start_job("snapshot", snapshot_job)
+                        if not started:
+                            st.info("ℹ️ Já existe uma atualização em andamento; acompanhando o progresso.")
+                job_panel()
+            st.stop()
+
+    # Seller list is cached for the process, so reruns don't hit the Sheets API
+    active_sellers, inactive_sellers = st.cache_data(ttl=600, show_spinner=False)(get_seller_names)()
+    seller_options = ["Todas"] + active_sellers + (["Sem vendedora"] if inactive_sellers else ["Sem vendedora"])
+    selected_seller = st.selectbox("Filtrar por vendedora:", seller_options)
+
+    snapshot = st.session_state.snapshot_df
+    # Relative dates ("3 dias") depend on today, so the day is part of the key
+    view_key = (st.session_state.snapshot_id, selected_seller, tuple(active_sellers), f"{today:%Y-%m-%d}")
+    with metrics.stage("dashboard_view", seller=selected_seller) as step:
+        view = cached_view(*view_key, snapshot)
+        step.rows = len(view["rows"])
+    df = view["view"]
+    rows = view["rows"]
+
+    st.subheader("📨 Marcação de mensagens por segmento")
+    query = st.text_input("🔍 Buscar cliente por CNPJ ou nome")
+    matches = search_mask(rows, query) if query.strip() else None
+
+    updated_rows = []
+
+    for title, positions in view["groups"].items():
+        # Row positions are presorted by last purchase; a page is a slice of them
+        if matches is not None:
+            positions = positions[matches[positions]]
+        total_rows = len(positions)
+        max_page = max((total_rows - 1) // PAGE_SIZE, 0)
+        page_key = f"page_{title}"
+        if page_key not in st.session_state.pagination:
+            st.session_state.pagination[page_key] = 0
+        st.session_state.pagination[page_key] = min(st.session_state.pagination[page_key], max_page)
+
+        with st.expander(f"{title}", expanded=True):
+            st.markdown(f"({total_rows} clientes)")
+
+            current_page = st.session_state.pagination[page_key]
+            start = current_page * PAGE_SIZE
+            end = start + PAGE_SIZE
+            paginated_df = rows.iloc[positions[start:end]]
+
+            edited_df = paginated_df.copy() # Paginate
+            edited_df["Enviado?"] = edited_df["message_sent"]  # Default unchecked
+
+            # Check all toggle
+            check_all = st.checkbox("✔️ Selecionar todos os 10", key=f"check_all_{title}")
+            if check_all:
+                edited_df["message_sent"] = True
+
+            # Change display name
+            edited_df_display = edited_df[[
+                "name", "cnpj", "seller_name", "recency", "frequency", "Valor (R$)",
+                "1ª compra", "Última compra", "m0_rfm", "m1_rfm", "Enviado?"
+            ]].rename(columns={
+                "name": "Cliente", "cnpj": "CNPJ", "seller_name": "Vendedora",
+                "recency": "Recência", "frequency": "Frequência",
+                "m0_rfm": "RFM atual", "m1_rfm": "RFM (M-1)","message_sent":"Enviado?"
+            })
+
+            # COLUMNS TO SHOW
+            edited_df_display = st.data_editor(
+                edited_df_display,
+                key=f"editor_{title}",
+                use_container_width=True,
+                hide_index=True,
+                num_rows="dynamic",
+                column_order=[
+                    "Cliente", "CNPJ", "Vendedora", "Recência", "Frequência", "Valor (R$)",
+                    "1ª compra", "Última compra", "Snapshot", "RFM Mês 0", "RFM Mês 1", "Enviado?"
+                ]
+            )
+            edited_with_cnpj = edited_df_display.merge(
+                paginated_df[["cnpj", "original_index"]],
+                how="left",
+                left_on="CNPJ",
+                right_on="cnpj"
+            )
+
+            for _, row in edited_with_cnpj.iterrows():
+                if row["Enviado?"]:
+                    updated_rows.append((row["original_index"], True))
+
+            col1, col2 = st.columns([1, 6])
+            with col1:
+                if current_page > 0:
+                    if st.button("⬅️ Anterior", key=f"prev_{title}"):
+                        st.session_state.pagination[page_key] -= 1
+            with col2:
+                if current_page < max_page:
+                    if st.button("Próximo ➡️", key=f"next_{title}"):
+                        st.session_state.pagination[page_key] += 1
+
+
+    # SAVE CHECKS TO GOOGLE SHEETS
+    if updated_rows:
+        if st.button("📅 Salvar marcações de mensagem"):
+            # Only the message_sent cells that actually changed are sent; rows hidden by the
+            # seller filter stay as they are in the sheet
+            indexes = [idx for idx, _ in updated_rows]
+            changes = snapshot.loc[indexes, ["cnpj"]].assign(message_sent=[is_checked for _, is_checked in updated_rows])
+
+            try:
+                stats = SheetSync(get_worksheet(snapshot_title), "cnpj", snapshot).upsert_rows(changes)
+                updated = snapshot.copy()
+                updated.loc[indexes, "message_sent"] = changes["message_sent"].to_numpy()
+                set_snapshot(updated)
+                save_snapshot_version(snapshot_title, st.session_state.snapshot_df)
+                st.success(f"✅ Marcações salvas e sincronizadas com o Google Sheet! ({stats['updated_cells']} células alteradas)")
+            except Exception as e:
+                st.error(f"❌ Erro ao salvar no Google Sheet: {e}")
+
+    df_plot = view["chart"]
+
+    fig = px.bar(
+        df_plot,
+        x="Segmento",
+        y="Clientes",
+        color="Segmento",
+        text="% do total",
+        color_discrete_sequence=px.colors.qualitative.Safe,
+        labels={"Clientes": "Nº de Clientes"},
+        title="📊 Nº de Clientes por Segmento RFM"
+    )
+    fig.update_traces(texttemplate='%{text}%', textposition='outside')
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        yaxis=dict(showgrid=True, gridcolor="lightgrey"),
+        plot_bgcolor='white',
+        showlegend=False
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    # 🔀 Migração entre segmentos (arquivo histórico local, consultas indexadas por mês)
+    st.subheader("🔀 Migração entre segmentos")
+    archived = archived_days()
+    if len(archived) < 2:
+        st.info("ℹ️ O arquivo histórico ainda não tem dois meses de snapshots para comparar.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            from_day = st.selectbox("De", archived[:-1], index=len(archived) - 2)
+        with col2:
+            to_options = [d for d in archived if d > from_day]
+            to_day = st.selectbox("Para", to_options, index=len(to_options) - 1)
+
+        archive_seller, excluded_sellers = archive_filters(selected_seller, active_sellers)
+        matrix, flow = cached_migration(archive_version(), from_day, to_day, archive_seller, tuple(excluded_sellers))
+        matrix = matrix.loc[matrix.sum(axis=1) > 0, matrix.sum(axis=0) > 0]
+
+        fig = px.imshow(
+            matrix,
+            text_auto=True,
+            color_continuous_scale="Blues",
+            labels={"x": "Para", "y": "De", "color": "Clientes"},
+            title=f"Clientes por segmento: {from_day} → {to_day}"
+        )
+        fig.update_layout(xaxis_tickangle=-45)
+        st.plotly_chart(fig, use_container_width=True)
+
+        fig = px.bar(
+            flow.melt(id_vars="snapshot_day", value_vars=["novos", "churn", "reativados"], var_name="Fluxo", value_name="Clientes"),
+            x="snapshot_day",
+            y="Clientes",
+            color="Fluxo",
+            barmode="group",
+            labels={"snapshot_day": "Snapshot"},
+            title="📉 Novos, churn e reativados por mês"
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
+    st.subheader("⬇️ Exportar")
+    # Files are written to disk in chunks on the first click (scripts/exports.py) and kept per
+    # snapshot version and seller; later clicks just read the file
+    def export_download(fmt):
+        with metrics.stage("export", fmt=fmt) as step:
+            path = export_file(view["view"], st.session_state.snapshot_id, export_name(selected_seller, active_sellers), fmt)
+            step.rows = len(view["view"])
+        return read_export(path)
 
 
+    for col, (fmt, label) in zip(st.columns(3), [("csv", "📥 Baixar CSV"), ("xlsx", "📥 Baixar Excel"), ("parquet", "📥 Baixar Parquet")]):
+        with col:
+            st.download_button(
+                label=label,
+                data=lambda fmt=fmt: export_download(fmt),
+                file_name=f"rfv_clientes.{fmt}",
+                mime=EXPORT_FORMATS[fmt],
+                key=f"{fmt}_download_button"
+            )
 
 
 
+    # 🔗 Link to open the Google Sheet (styled like a button)
+    try:
+        sheet = get_google_sheet()
+        sheet_url = sheet.url
+
+        st.markdown(
+            f"""
+            <a href="{sheet_url}" target="_blank">
+                <button style="
+                    background-color: #4CAF50;
+                    color: white;
+                    padding: 0.5em 1.5em;
+                    border: none;
+                    border-radius: 4px;
+                    font-size: 16px;
+                    cursor: pointer;
+                    margin-top: 1em;
+                ">
+                    📄 Abrir no Google Sheets
+                </button>
+            </a>
+            """,
+            unsafe_allow_html=True
+        )
+
+    except Exception as e:
+        st.warning(f"⚠️ Não foi possível gerar o link do Google Sheet: {e}")
+
+    rerun.rows = len(snapshot)
+
+# 🩺 Diagnóstico: últimas etapas medidas (painel, jobs e CLI nesta máquina) a partir do log JSONL
+if os.getenv("RFM_DIAGNOSTICS") == "1" or st.query_params.get("diagnostico") == "1":
+    with st.expander("🩺 Diagnóstico", expanded=False):
+        records = metrics.read_recent()
+        if records.empty:
+            st.info("ℹ️ Nenhuma medição registrada ainda.")
+        else:
+            st.caption(f"Últimas {len(records)} etapas registradas em {metrics.log_path() or 'memória'}")
+            st.markdown("**Por etapa**")
+            st.dataframe(metrics.stage_summary(records), use_container_width=True)
+            st.markdown("**Últimas execuções**")
+            st.dataframe(records.iloc[::-1].head(100), use_container_width=True, hide_index=True)
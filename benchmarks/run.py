@@ -0,0 +1,260 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_clients, generate_orders
+from scripts.dashboard_views import build_view
+from scripts.exports import export_file
+from scripts.rfv import build_rfv_report
+from scripts.rfv_core import SNAPSHOT_COLUMNS, generate_rfv_history, generate_rfv_snapshot, typed_snapshot
+from scripts.snapshot_cache import read_cached_snapshot, write_cached_snapshot
+
+# ⏱️ Benchmark do pipeline RFM com dados sintéticos (semente fixa): tempo e pico de memória
+# por etapa, em vários tamanhos. O resultado vai para um JSON para comparar entre commits.
+# Uso: python -m benchmarks.run --sizes 10k 100k 1M [--stages snapshot dashboard_view] [--compare antigo.json]
+SNAPSHOT_DATE = pd.Timestamp("2025-06-30")
+DEFAULT_SIZES = ["10k", "100k", "1M"]
+# XLSX is by far the slowest export; bigger views are skipped unless --xlsx-max-rows is raised
+XLSX_MAX_ROWS = 1_048_575
+SAMPLE_INTERVAL = 0.005
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 10**3, "m": 10**6}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def size_label(n):
+    for suffix, scale in (("M", 10**6), ("k", 10**3)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# Peak memory of one stage: resident set sampled in a thread (what the Render box sees),
+# or tracemalloc where /proc is not available (slower, counts Python allocations only)
+class PeakMemory:
+    def __init__(self):
+        self.use_rss = os.path.exists("/proc/self/statm")
+        self.peak = 0
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        gc.collect()
+        if self.use_rss:
+            self.baseline = self.peak = rss_bytes()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        else:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.use_rss:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, rss_bytes())
+            self.increase = self.peak - self.baseline
+        else:
+            self.increase = self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def measure(fn):
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    return result, {"seconds": round(elapsed, 4), "peak_mb": round(memory.increase / 1e6, 1)}
+
+
+def rows_of(result):
+    return len(result) if hasattr(result, "__len__") else None
+
+
+# 🧩 Etapas: cada uma recebe o estado (pedidos, clientes, resultados anteriores) e devolve um resultado
+def stage_snapshot(state):
+    return generate_rfv_snapshot(state["orders"], SNAPSHOT_DATE)
+
+
+def stage_history(state):
+    return generate_rfv_history(state["orders"], SNAPSHOT_DATE, months=12)
+
+
+def stage_rfv_report(state):
+    pedidos = state["orders"].rename(columns={
+        "orderId": "order_id", "customerId": "customer_cnpj",
+        "createdAt": "data_pedido", "netValue": "total_value"
+    })
+    clientes = state["clients"].rename(columns={"document": "cnpj", "name": "cliente"})
+    return build_rfv_report(pedidos, clientes, SNAPSHOT_DATE.strftime("%Y-%m-%d"))
+
+
+def dashboard_snapshot(state):
+    # Same shape as the rfm_snapshot_* sheet: snapshot + client name, keyed by cnpj
+    snapshot = state.get("snapshot")
+    if snapshot is None:
+        snapshot = state["snapshot"] = stage_snapshot(state)
+    names = state["clients"][["document", "name"]].rename(columns={"document": "customerId"})
+    df = snapshot.merge(names, on="customerId", how="left").rename(columns={"customerId": "cnpj"})
+    return typed_snapshot(df[SNAPSHOT_COLUMNS])
+
+
+def stage_dashboard_view(state):
+    df = state["typed_snapshot"]
+    return build_view(df, "Todas", [])["rows"]
+
+
+def export_stage(fmt):
+    def stage(state):
+        df = state["typed_snapshot"]
+        if fmt == "xlsx" and len(df) > state["xlsx_max_rows"]:
+            raise SkipStage(f"{len(df)} linhas acima do limite de {state['xlsx_max_rows']} para xlsx")
+        # A new version per size, so the file is always written (not read from the export cache)
+        path = export_file(df, f"bench-{len(state['orders'])}", "rfv_clientes", fmt)
+        state.setdefault("export_mb", {})[fmt] = round(os.path.getsize(path) / 1e6, 2)
+        return df
+    return stage
+
+
+def stage_parquet_cache(state):
+    df = state["typed_snapshot"]
+    write_cached_snapshot("rfm_snapshot_bench", df, "bench")
+    return typed_snapshot(read_cached_snapshot("rfm_snapshot_bench")[0])
+
+
+class SkipStage(Exception):
+    pass
+
+
+STAGES = {
+    "snapshot": stage_snapshot,
+    "history_12m": stage_history,
+    "rfv_report": stage_rfv_report,
+    "dashboard_view": stage_dashboard_view,
+    "export_csv": export_stage("csv"),
+    "export_xlsx": export_stage("xlsx"),
+    "export_parquet": export_stage("parquet"),
+    "parquet_cache": stage_parquet_cache,
+}
+# Stages that read the typed snapshot; it is built (untimed) before the first of them
+VIEW_STAGES = {"dashboard_view", "export_csv", "export_xlsx", "export_parquet", "parquet_cache"}
+DEFAULT_STAGES = ["snapshot", "rfv_report", "dashboard_view", "export_csv", "export_xlsx", "export_parquet", "parquet_cache"]
+
+
+def run_size(n_orders, stages, seed, xlsx_max_rows):
+    orders, gen = measure(lambda: generate_orders(n_orders, seed=seed))
+    clients = generate_clients(orders, seed=seed)
+    print(f"🧪 {size_label(n_orders)} pedidos, {len(clients)} clientes (gerados em {gen['seconds']:.1f}s)")
+    state = {"orders": orders, "clients": clients, "xlsx_max_rows": xlsx_max_rows}
+    results = {"orders": n_orders, "customers": len(clients), "generate": gen, "stages": {}}
+
+    for name in stages:
+        try:
+            if name in VIEW_STAGES and "typed_snapshot" not in state:
+                state["typed_snapshot"] = dashboard_snapshot(state)
+            result, stats = measure(lambda: STAGES[name](state))
+            stats["rows_out"] = rows_of(result)
+            if name == "snapshot":
+                state["snapshot"] = result
+            del result
+            print(f"  {name:<15} {stats['seconds']:9.3f}s  pico +{stats['peak_mb']:8.1f} MB")
+        except SkipStage as e:
+            stats = {"skipped": str(e)}
+            print(f"  {name:<15} ⏭️ {e}")
+        except Exception as e:
+            stats = {"error": f"{type(e).__name__}: {e}"}
+            print(f"  {name:<15} ❌ {stats['error']}")
+        results["stages"][name] = stats
+    results["export_mb"] = state.get("export_mb", {})
+    return results
+
+
+def environment(seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "seed": seed,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "memory": "rss" if os.path.exists("/proc/self/statm") else "tracemalloc",
+    }
+
+
+# 🔁 Tempo de cada etapa contra um resultado anterior (razão > 1 = mais lento agora)
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\n🔁 Comparação com {previous_path} (commit {previous['environment'].get('commit')})")
+    for label, size in current["sizes"].items():
+        before = previous["sizes"].get(label, {}).get("stages", {})
+        for name, stats in size["stages"].items():
+            old = before.get(name, {})
+            if "seconds" in stats and old.get("seconds"):
+                ratio = stats["seconds"] / old["seconds"]
+                print(f"  {label:>5} {name:<15} {old['seconds']:9.3f}s → {stats['seconds']:9.3f}s  ×{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline RFM com dados sintéticos")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="nº de pedidos, ex.: 10k 100k 1M 10M")
+    parser.add_argument("--stages", nargs="+", default=DEFAULT_STAGES, help=f"etapas: {', '.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--xlsx-max-rows", type=int, default=XLSX_MAX_ROWS)
+    parser.add_argument("--out", help="arquivo JSON (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"etapas desconhecidas: {', '.join(unknown)} (opções: {', '.join(STAGES)})")
+    try:
+        sizes = [parse_size(s) for s in args.sizes]
+    except ValueError:
+        parser.error(f"tamanho inválido em {args.sizes}")
+    out = args.out or os.path.join("benchmarks", "results", f"{pd.Timestamp.now():%Y%m%dT%H%M%S}.json")
+
+    report = {"environment": environment(args.seed), "sizes": {}}
+    # The parquet stage writes through the real cache module; keep it out of the data folder
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RFM_DATA_DIR"] = tmp
+        for n in sizes:
+            report["sizes"][size_label(n)] = run_size(n, args.stages, args.seed, args.xlsx_max_rows)
+            gc.collect()
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados em {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
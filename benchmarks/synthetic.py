@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# 🧪 Gerador sintético (semente fixa) de Pedidos/Clientes com formato parecido com o real:
+# nº de pedidos por cliente em lei de potência, clientes com janela de atividade própria
+# (gera recências variadas), várias vendedoras, pedidos sem vendedora, linhas ESPERA e ECOMMERCE.
+SELLERS = ["Ana", "Bia", "Carla", "Duda", "Eva", "Fabi", "Gabi", "Helô"]
+STATUSES = ["FATURADO", "ENTREGUE", "CANCELADO"]
+STORES = ["LOJA", "B2B"]
+
+
+def customer_ids(n):
+    # 14-digit CNPJ-like strings
+    return pd.Series(np.arange(n, dtype=np.int64) + 10**13).astype(str).to_numpy(dtype=object)
+
+
+def generate_orders(n_orders, seed=0, start="2022-01-01", end="2025-06-30", orders_per_customer=8,
+                    espera_share=0.03, ecommerce_share=0.1, missing_seller_share=0.05, seller_switch_share=0.1):
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, n_orders // orders_per_customer)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span_days = (end - start).days
+
+    # Heavy-tailed popularity: a few customers place most of the orders
+    weights = rng.pareto(1.2, n_customers) + 1
+    customer = rng.choice(n_customers, size=n_orders, p=weights / weights.sum())
+
+    # Each customer buys inside its own window (first purchase .. churn)
+    first_day = rng.integers(0, span_days, n_customers)
+    active_days = np.minimum(rng.exponential(span_days / 3, n_customers).astype(np.int64) + 1, span_days - first_day)
+    order_day = first_day[customer] + (rng.random(n_orders) * active_days[customer]).astype(np.int64)
+
+    home_seller = rng.integers(0, len(SELLERS), n_customers)
+    seller_code = np.where(rng.random(n_orders) < seller_switch_share,
+                           rng.integers(0, len(SELLERS), n_orders), home_seller[customer])
+    seller = np.asarray(SELLERS, dtype=object)[seller_code]
+    seller[rng.random(n_orders) < missing_seller_share] = None
+
+    status = np.asarray(STATUSES, dtype=object)[rng.integers(0, len(STATUSES), n_orders)]
+    status[rng.random(n_orders) < espera_share] = "ESPERA"
+    loja = np.asarray(STORES, dtype=object)[rng.integers(0, len(STORES), n_orders)]
+    loja[rng.random(n_orders) < ecommerce_share] = "ECOMMERCE"
+
+    return pd.DataFrame({
+        "orderId": pd.Series(np.arange(n_orders, dtype=np.int64) + 1).astype(str),
+        "customerId": customer_ids(n_customers)[customer],
+        "createdAt": start + pd.to_timedelta(order_day, unit="D"),
+        "seller": seller,
+        "netValue": rng.lognormal(6.5, 1.0, n_orders).round(2),
+        "status": status,
+        "loja": loja,
+    })
+
+
+def random_phones(rng, n, missing_share):
+    ddd = rng.integers(11, 99, n)
+    number = rng.integers(10**7, 10**8, n)
+    formats = rng.integers(0, 5, n)
+    phones = np.empty(n, dtype=object)
+    for f, template in enumerate([
+        "({ddd}) 9{a}-{b}",       # mobile, punctuated
+        "{ddd}9{n}",              # mobile, digits only
+        "{ddd}{n}",               # old 10-digit number
+        "+55 {ddd} 9{a}-{b}",     # already with country code
+        "{n}",                    # too short: invalid
+    ]):
+        idx = np.flatnonzero(formats == f)
+        phones[idx] = [template.format(ddd=d, n=x, a=str(x)[:4], b=str(x)[4:]) for d, x in zip(ddd[idx], number[idx])]
+    phones[rng.random(n) < missing_share] = ""
+    return phones
+
+
+# 🧍 Aba Clientes (colunas da API: document, name, seller, whatsapp/telefone/mobile)
+def generate_clients(orders, seed=0, missing_phone_share=0.3):
+    rng = np.random.default_rng(seed + 1)
+    documents = pd.unique(orders["customerId"])
+    n = len(documents)
+    seller = np.asarray(SELLERS, dtype=object)[rng.integers(0, len(SELLERS), n)]
+    seller[rng.random(n) < 0.1] = ""
+    return pd.DataFrame({
+        "document": documents,
+        "name": [f"Cliente {i}" for i in range(n)],
+        "seller": seller,
+        "whatsapp": random_phones(rng, n, 0.7),
+        "telefone": random_phones(rng, n, missing_phone_share),
+        "mobile": random_phones(rng, n, missing_phone_share),
+    })
@@ -0,0 +1,92 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from gspread.utils import numericise_all
+from scripts.rfv_core import RFM_ORDER, SNAPSHOT_COLUMNS, typed_snapshot
+from scripts.sheet_sync import sheet_values
+
+# ⏱️ Benchmark: abrir um snapshot a partir das linhas do Sheets x do cache Parquet local.
+# Uso: python -m scripts.bench_snapshot_cache --customers 50000
+# O caminho do Sheets aqui conta só o parse (get_all_records -> DataFrame tipado), sem a rede.
+
+
+def synthetic_snapshot(customers, seed=0):
+    rng = np.random.default_rng(seed)
+    snapshot_day = pd.Timestamp("2025-06-30")
+    last = snapshot_day - pd.to_timedelta(rng.integers(0, 720, customers), unit="D")
+    first = last - pd.to_timedelta(rng.integers(0, 720, customers), unit="D")
+    new_customer = rng.random(customers) < 0.1
+    df = pd.DataFrame({
+        "name": [f"Cliente {i}" for i in range(customers)],
+        "cnpj": [f"{10**13 + i}" for i in range(customers)],
+        "seller_name": rng.choice(["Ana", "Bia", "Carla", "Duda", None], customers),
+        "recency": (snapshot_day - last).days,
+        "frequency": rng.integers(1, 40, customers),
+        "value": rng.gamma(2.0, 800.0, customers).round(2),
+        "first_purchase_date": first,
+        "last_purchase_date": last,
+        "snapshot_day": snapshot_day,
+        "m0_rfm": rng.choice(RFM_ORDER, customers),
+        "prev_recency": np.where(new_customer, np.nan, rng.integers(0, 720, customers)),
+        "prev_frequency": np.where(new_customer, np.nan, rng.integers(1, 40, customers)),
+        "prev_value": np.where(new_customer, np.nan, rng.gamma(2.0, 800.0, customers).round(2)),
+        "m1_rfm": np.where(new_customer, "Sem histórico", rng.choice(RFM_ORDER, customers)),
+        "rfm_change": rng.random(customers) < 0.3,
+        "change_value": rng.normal(0, 500, customers).round(2),
+        "message_sent": rng.random(customers) < 0.2,
+    })
+    return typed_snapshot(df)[SNAPSHOT_COLUMNS]
+
+
+def sheet_records(df):
+    # What get_all_records() hands back: numericised cells, booleans as "TRUE"/"FALSE"
+    rows = sheet_values(df)
+    header = rows[0]
+    return [
+        dict(zip(header, numericise_all([("TRUE" if v else "FALSE") if isinstance(v, bool) else str(v) for v in row])))
+        for row in rows[1:]
+    ]
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=50000)
+    args = parser.parse_args()
+
+    df = synthetic_snapshot(args.customers)
+    records = sheet_records(df)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RFM_DATA_DIR"] = tmp
+        from scripts.snapshot_cache import cache_path, read_cached_snapshot, write_cached_snapshot
+
+        title = "rfm_snapshot_bench"
+        write_cached_snapshot(title, df, "bench")
+        file_size = os.path.getsize(cache_path(title))
+
+        from_sheet, sheet_time, sheet_peak = measure(lambda: typed_snapshot(pd.DataFrame(records)))
+        from_cache, cache_time, cache_peak = measure(lambda: typed_snapshot(read_cached_snapshot(title)[0]))
+
+    pd.testing.assert_frame_equal(from_sheet, from_cache, check_categorical=False)
+    print(f"📊 Snapshot com {args.customers} clientes (Parquet: {file_size / 1e6:.1f} MB)")
+    print(f"  Sheets (parse)  {sheet_time:7.3f}s  pico {sheet_peak / 1e6:7.1f} MB")
+    print(f"  Cache Parquet   {cache_time:7.3f}s  pico {cache_peak / 1e6:7.1f} MB")
+    print(f"  Em memória      {from_cache.memory_usage(deep=True).sum() / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
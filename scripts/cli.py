@@ -0,0 +1,119 @@
+import argparse
+import sys
+import time
+import gspread
+from scripts.data_pipeline import (
+    PipelineContext, current_snapshot_date, export_orders_to_sheet, generate_and_save_snapshot,
+    import_orders_from_sheet, snapshot_sheet_title, update_data
+)
+from scripts import metrics
+from scripts.job_lock import JobLock, LockBusy
+from scripts.rfv import run_rfv
+from scripts.sheets import api_call_count, get_worksheet
+
+# 🖥️ Atualização sem o painel (cron / Render cron job):
+#   python -m scripts.cli                  -> update + snapshot
+#   python -m scripts.cli update rfv       -> só as etapas pedidas, na ordem dada
+#   python -m scripts.cli snapshot --force -> recria o snapshot do mês mesmo se a aba já existe
+#   python -m scripts.cli export-pedidos   -> reescreve a aba "Pedidos" inteira a partir do banco local
+#   python -m scripts.cli import-pedidos   -> relê a aba "Pedidos" inteira para o banco local
+# Códigos de saída: 0 ok, 1 alguma etapa falhou, 75 outro job em andamento (trava ocupada).
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_LOCKED = 75
+
+
+class StageFailed(RuntimeError):
+    pass
+
+
+def stage_update(ctx, args):
+    update_data(ctx)
+
+
+def stage_snapshot(ctx, args):
+    title = snapshot_sheet_title(current_snapshot_date())
+    if not args.force:
+        try:
+            get_worksheet(title)
+            # Recreating the sheet would wipe the message marks saved from the dashboard
+            print(f"ℹ️ {title} já existe; use --force para recriar.")
+            return
+        except gspread.WorksheetNotFound:
+            pass
+    if generate_and_save_snapshot(ctx).empty:
+        raise StageFailed("snapshot vazio (ver mensagens acima)")
+
+
+def stage_rfv(ctx, args):
+    run_rfv()
+
+
+def stage_export_orders(ctx, args):
+    export_orders_to_sheet(ctx)
+
+
+def stage_import_orders(ctx, args):
+    import_orders_from_sheet(ctx)
+
+
+STAGES = {
+    "update": stage_update,
+    "snapshot": stage_snapshot,
+    "rfv": stage_rfv,
+    "export-pedidos": stage_export_orders,
+    "import-pedidos": stage_import_orders,
+}
+DEFAULT_STAGES = ["update", "snapshot"]
+
+
+def run_stages(names, args):
+    ctx = PipelineContext()
+    run_id = metrics.new_run("cli")
+    timings = []
+    failed = False
+    for name in names:
+        print(f"▶️ {name}")
+        started = time.perf_counter()
+        try:
+            with metrics.stage(name):
+                STAGES[name](ctx, args)
+            status = "ok"
+        except Exception as e:
+            status = "falhou"
+            failed = True
+            print(f"❌ {name}: {type(e).__name__}: {e}")
+        timings.append((name, status, time.perf_counter() - started))
+        if failed:
+            # Later stages read what the earlier ones wrote
+            timings.extend((n, "pulado", 0.0) for n in names[len(timings):])
+            break
+
+    print("\n⏱️ Resumo")
+    for name, status, elapsed in timings:
+        print(f"  {name:<10} {status:<8} {elapsed:8.1f}s")
+    print(f"  {'total':<10} {'':<8} {sum(t[2] for t in timings):8.1f}s  ({api_call_count()} chamadas à API do Sheets)")
+    if metrics.log_path():
+        print(f"📏 Métricas por etapa (execução {run_id}) em {metrics.log_path()}")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scripts.cli", description="Atualização do RFM sem o painel")
+    parser.add_argument("stages", nargs="*", help=f"etapas: {', '.join(STAGES)} (padrão: {' '.join(DEFAULT_STAGES)})")
+    parser.add_argument("--force", action="store_true", help="recria o snapshot do mês mesmo se a aba já existe")
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"etapa desconhecida: {', '.join(unknown)}")
+
+    try:
+        with JobLock():
+            return run_stages(args.stages or DEFAULT_STAGES, args)
+    except LockBusy as e:
+        print(f"🔒 {e}; nada a fazer.")
+        return EXIT_LOCKED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import hashlib
+import re
+import numpy as np
+import pandas as pd
+from scripts.order_store import to_text
+from scripts.rfv_core import RFM_ORDER
+from scripts.utils import format_brl_values, relative_dates
+
+# 📨 Grupos de segmentos exibidos no painel
+RFV_GROUPS = {
+    "🏆 Campeões de vendas": ["Campeões", "Leais"],
+    "🔄 Potenciais vendas": ["Potenciais Leais", "Recentes", "Promissores", "Precisam Atenção", "Não pode perdê-los"],
+    "⚠️ Atenção": ["Em risco", "Prestes a dormir", "Hibernando"],
+    "❄️ Perdidos": ["Perdidos"]
+}
+# 🚫 Fora do painel
+EXCLUDED_SELLERS = ["NUVEMSHOP"]
+EXCLUDED_CNPJS = ["1"]
+
+
+# 🆔 Identificador do conteúdo do snapshot; muda sempre que o snapshot muda (chave dos caches)
+def snapshot_id(title, df):
+    return f"{title}:{len(df)}:{pd.util.hash_pandas_object(df, index=True).sum():x}"
+
+
+# 🔎 Linhas visíveis para a vendedora escolhida
+def seller_view(df, seller, active_sellers):
+    df = df[~df["seller_name"].isin(EXCLUDED_SELLERS) & ~df["cnpj"].isin(EXCLUDED_CNPJS)]
+
+    if seller == "Sem vendedora":
+        df = df[~df["seller_name"].isin(active_sellers)]
+    elif seller != "Todas":
+        df = df[df["seller_name"] == seller]
+
+    df = df[df["cnpj"].notna()]
+    return df[df["value"] > 0]
+
+
+# 🗂️ Índice de segmentos: colunas de exibição calculadas uma vez para todas as linhas e, por grupo,
+# as posições das linhas já ordenadas pela última compra (paginar = fatiar o array de posições).
+# original_index aponta para a linha no snapshot completo.
+def segment_index(view):
+    rows = view.reset_index(names="original_index")
+    first_purchase = rows["first_purchase_date"]
+    last_purchase = rows["last_purchase_date"]
+    today = pd.Timestamp.today()
+    rows["Valor (R$)"] = format_brl_values(rows["value"])
+    rows["1ª compra"] = relative_dates(first_purchase, today)
+    rows["Última compra"] = relative_dates(last_purchase, today)
+
+    # Search keys: CNPJ digits and lower-case name
+    rows["search_cnpj"] = to_text(rows["cnpj"]).fillna("").str.replace(r"\D", "", regex=True)
+    rows["search_name"] = rows["name"].fillna("").astype(str).str.lower()
+
+    order = last_purchase.sort_values(ascending=False, kind="stable").index.to_numpy()
+    segments = rows["m0_rfm"].to_numpy()[order]
+    groups = {title: order[np.isin(segments, names)] for title, names in RFV_GROUPS.items()}
+    return rows, groups
+
+
+# 🔍 Busca por CNPJ (só dígitos) ou nome; devolve uma máscara sobre as linhas do índice
+def search_mask(rows, query):
+    query = query.strip()
+    digits = re.sub(r"\D", "", query)
+    if digits and not re.search(r"[^\d\s./-]", query):
+        return rows["search_cnpj"].str.contains(digits, regex=False).to_numpy()
+    return rows["search_name"].str.contains(query.lower(), regex=False).to_numpy()
+
+
+# 📊 Nº de clientes por segmento para o gráfico
+def segment_chart_data(view):
+    segment_counts = view["m0_rfm"].value_counts().reindex(RFM_ORDER).fillna(0).astype(int)
+    df_plot = pd.DataFrame({
+        "Segmento": segment_counts.index,
+        "Clientes": segment_counts.values
+    })
+    df_plot["% do total"] = (df_plot["Clientes"] / df_plot["Clientes"].sum() * 100).round(0)
+    return df_plot
+
+
+def build_view(df, seller, active_sellers):
+    view = seller_view(df, seller, active_sellers)
+    rows, groups = segment_index(view)
+    return {
+        "view": view,
+        "rows": rows,
+        "groups": groups,
+        "chart": segment_chart_data(view),
+    }
+
+
+# 🔀 Mesmo filtro de vendedora para as consultas do arquivo histórico: (seller, exclude_sellers)
+def archive_filters(seller, active_sellers):
+    if seller == "Sem vendedora":
+        return None, EXCLUDED_SELLERS + list(active_sellers)
+    if seller == "Todas":
+        return None, EXCLUDED_SELLERS
+    return seller, EXCLUDED_SELLERS
+
+
+# ⬇️ Nome do arquivo exportado para um filtro ("Sem vendedora" depende da lista de ativas)
+def export_name(seller, active_sellers):
+    digest = hashlib.sha1("|".join(active_sellers).encode()).hexdigest()[:8]
+    return f"rfv_clientes_{seller}_{digest}"
@@ -1,86 +1,153 @@
 
 import pandas as pd
-import requests
+import logging
 import os
-from google.oauth2 import service_account
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from scripts.rfv_core import generate_rfv_snapshot
-from scripts.utils import get_google_sheet, clean_phone_number
-from requests.auth import HTTPBasicAuth
+from scripts.snapshot_state import generate_rfv_snapshot_incremental, invalidate_states
+from scripts.utils import get_google_sheet, contact_columns
+from scripts import metrics
+from scripts.sheets import add_worksheet, api_call_count, delete_worksheet, get_worksheet, read_records
+from scripts.order_store import get_order_store, normalize_orders, sheets_export_enabled, to_text
+from scripts.mire_client import MireClient
+from scripts.sheet_sync import SheetSync, sheet_values
+from scripts.rfv_core import SNAPSHOT_COLUMNS
+from scripts.snapshot_cache import save_snapshot_version
+from scripts.snapshot_archive import archive_snapshot, backfill_archive
 
 
 
 load_dotenv("config/.env")
 
-# 📅 Get last order date from "Pedidos" sheet
-def get_last_order_date():
-    sheet = get_google_sheet()
-    try:
-        orders = pd.DataFrame(sheet.worksheet("Pedidos").get_all_records())
-        orders["createdAt"] = pd.to_datetime(orders["createdAt"], errors="coerce") # dayfirst=True,
-        print("DATA MAXIMA", orders["createdAt"].max())
-        
-        return orders["createdAt"].max()
-    except Exception as e:
-        print("⚠️ Could not read 'Pedidos':", e)
-        return None
-
-# 🔁 Fetch missing orders day-by-day
-
-
+# Full response payloads are only logged at DEBUG level (e.g. LOG_LEVEL=DEBUG)
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 
-def fetch_orders_from_api(start_date, end_date):
-    url = "https://mire.omnni.com.br/api/orders"
-    username = os.getenv("API_USERNAME")
-    password = os.getenv("API_PASSWORD")
-    seller_id = os.getenv("API_SELLER_ID")
-
-    all_orders = []
-
-    current_date = start_date
-    while current_date <= end_date:
-        params = {
-            "data": current_date.strftime("%Y-%m-%d"),
-            "sellerid": seller_id
-        }
-
-        headers = {"Accept": "application/json"}
-        print(f"📡 Fetching orders for {current_date.strftime('%Y-%m-%d')}")
-        response = requests.get(url,headers=headers, params=params, auth=HTTPBasicAuth(username, password))
+# 📦 Local order store (system of record), seeded once from the "Pedidos" sheet when empty
+def get_seeded_order_store(load_frame=None):
+    store = get_order_store()
+    if store.count() == 0:
+        try:
+            existing = load_frame("Pedidos") if load_frame else pd.DataFrame(read_records(get_worksheet("Pedidos"), as_text=True))
+            imported = store.import_frame(existing)
+            print(f"📥 {imported['new']} pedidos importados da aba 'Pedidos' para o banco local.")
+        except Exception as e:
+            print("⚠️ Could not read 'Pedidos':", e)
+    return store
+
+
+# 🧠 Per-run data context: each worksheet (and the order history) is loaded at most once
+# per run, and the in-memory frames are kept current after writes
+class PipelineContext:
+    def __init__(self, progress=None):
+        self._store = None
+        self._frames = {}
+        self._syncs = {}
+        self._orders = None
+        self._new_orders = []
+        # progress(stage, done, total, detail) is called per day / per customer (see scripts/jobs.py)
+        self.progress = progress
+
+    def report(self, stage, done, total, detail=""):
+        if self.progress:
+            self.progress(stage, done, total, detail)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_seeded_order_store(self.frame)
+        return self._store
+
+    def frame(self, title):
+        if title in self._syncs:
+            return self._syncs[title].frame
+        if title not in self._frames:
+            # Read as text: CNPJs/orderIds keep their leading zeros and match the API keys
+            self._frames[title] = pd.DataFrame(read_records(get_worksheet(title), as_text=True))
+        return self._frames[title]
+
+    # Diff-based writer for a worksheet, reusing the frame already loaded in this run
+    def sync(self, title, key):
+        if title not in self._syncs:
+            self._syncs[title] = SheetSync(get_worksheet(title), key, self.frame(title))
+        return self._syncs[title]
+
+    def orders(self):
+        if self._orders is None:
+            self._orders = self.store.read()
+        elif self._new_orders:
+            # Chunks written during the run are merged once, when the history is next read
+            combined = pd.concat([self._orders, *self._new_orders], ignore_index=True)
+            self._orders = combined.drop_duplicates(subset="orderId", keep="last").reset_index(drop=True)
+        self._new_orders = []
+        return self._orders
+
+    def orders_since(self, since):
+        if self._orders is None:
+            return self.store.read(since=since)
+        orders = self.orders()
+        return orders if since is None else orders[orders["createdAt"] > since]
+
+    def add_orders(self, new_orders):
+        if self._orders is None or new_orders.empty:
+            return
+        self._new_orders.append(new_orders.reindex(columns=self._orders.columns))
+
+    # The store was rewritten in bulk: read the history again next time it is needed
+    def reload_orders(self):
+        self._orders = None
+        self._new_orders = []
+
+
+# 📅 Get last order date from the local order store
+def get_last_order_date():
+    last_date = get_seeded_order_store().last_order_date()
+    print("DATA MAXIMA", last_date)
+    return last_date
+
+# 🔁 Stream missing orders day-by-day: one normalized, typed chunk every `chunk_days` days
+def iter_order_chunks(start_date, end_date, client=None, chunk_days=7, progress=None):
+    client = client or MireClient()
+    total_days = (end_date.date() - start_date.date()).days + 1
+
+    chunk = []
+    # Days are fetched concurrently but come back in date order
+    for done, (current_date, response) in enumerate(client.fetch_orders(start_date, end_date), start=1):
+        day = current_date.strftime('%Y-%m-%d')
+        if progress:
+            progress("pedidos", done, total_days, day)
+        if response is None:
+            continue
 
-        
-        print(response.status_code)
-        print(response.headers.get("Content-Type"))
-        print(response.text[:500])  # first 500 chars of response
+        logger.debug("%s %s %s", response.status_code, response.headers.get("Content-Type"), response.text[:500])
 
         if response.status_code == 200:
             daily_data = response.json()
-            print('daily_data: ', daily_data)
-            all_orders.extend(daily_data)
+            logger.debug("daily_data %s: %s", day, daily_data)
+            daily_orders = normalize_orders(daily_data)
+            daily_orders = daily_orders[daily_orders["status"] != "ESPERA"]
+            print(f"📡 {day}: {len(daily_orders)} pedidos")
+            chunk.append(daily_orders)
         else:
-            print(f"❌ Failed for {current_date.strftime('%Y-%m-%d')}: {response.status_code}")
+            print(f"❌ Failed for {day}: {response.status_code}")
 
-        current_date += timedelta(days=1)
+        if len(chunk) >= chunk_days:
+            yield pd.concat(chunk, ignore_index=True)
+            chunk = []
 
-    return pd.DataFrame(all_orders)
+    if chunk:
+        yield pd.concat(chunk, ignore_index=True)
 
-# 🧩 Safely backfill orders into Google Sheets
-def backfill_orders_if_needed():
-    sheet = get_google_sheet()
-    today = datetime.today()
-    
-    try:
-        orders_ws = sheet.worksheet("Pedidos")
-        existing = pd.DataFrame(orders_ws.get_all_records())
-        existing.columns = existing.columns.str.strip()
-        last_date = pd.to_datetime(existing["createdAt"]).max()
 
-    except Exception as e:
-        print(f"⚠️ Could not read 'Pedidos': {e}")
-        return
+# 🧩 Safely backfill orders into the local store (Sheets is an optional export)
+def backfill_orders_if_needed(ctx=None):
+    ctx = ctx or PipelineContext()
+    store = ctx.store
+    today = datetime.today()
+    last_date = store.last_order_date()
 
-    if pd.isna(last_date):
+    if last_date is None or pd.isna(last_date):
         start_date = today - timedelta(days=365)
         print(f"🔄 No valid last date found. Backfilling from {start_date.date()} to {today.date()}")
     
@@ -91,144 +158,186 @@ def backfill_orders_if_needed():
         start_date = last_date + timedelta(days=1)
         print(f"🔄 Backfilling from {start_date.date()} to {today.date()}")
 
-    # Fetch new orders
-    new_orders = fetch_orders_from_api(start_date, today)
-
-    if not new_orders.empty:
-        # Use existing sheet structure if available
-        expected_columns = existing.columns.tolist() if not existing.empty else new_orders.columns.tolist()
-
-        # Ensure all expected columns exist in new data
-        for col in expected_columns:
-            if col not in new_orders.columns:
-                new_orders[col] = None
-        # print(new_orders.columns)
-        
-        # Order columns to match
-        new_orders = new_orders[expected_columns]
-        new_orders = new_orders[new_orders.status != "ESPERA"]
-
-        # Format date
-        if "createdAt" in new_orders.columns:
-            # print(new_orders.createdAt.dtype)
-            new_orders["createdAt"] = pd.to_datetime(new_orders["createdAt"], errors="coerce").dt.strftime("%Y-%m-%d")
-
-        # Combine and format
-        updated = pd.concat([existing, new_orders], ignore_index=True)
-
-        # Remove duplicates by 'orderId' (keep the latest entry)
-        if "orderId" in updated.columns:
-            updated = updated.drop_duplicates(subset="orderId", keep="last")
-
-        # Format all values
-        updated = updated.fillna("").astype(str)
-
-        # Push to sheet
-        orders_ws.update([updated.columns.tolist()] + updated.values.tolist())
-        print("✅ Orders updated.")
-    else:
-        print("ℹ️ No new orders.")
-
-
-
-# 🧍 Check and backfill missing clients
-def fetch_clients_by_cnpj(customer_ids):
-    url_base = "https://mire.omnni.com.br/api/customers"
-    username = os.getenv("API_USERNAME")
-    password = os.getenv("API_PASSWORD")
-    seller_id = os.getenv("API_SELLER_ID")
-
-    sheet = get_google_sheet()
-    orders_df = pd.DataFrame(sheet.worksheet("Pedidos").get_all_records())
-
-    clients_data = []
-    for customer_id in customer_ids:
-        if pd.isna(customer_id) or customer_id in ("#N/A", "nan", ""):
+    # Fetch new orders and write them chunk by chunk, so memory doesn't grow with the backfill
+    totals = {"new": 0, "changed": 0, "unchanged": 0}
+    for new_orders in metrics.timed_iter("fetch_orders", iter_order_chunks(start_date, today, progress=ctx.report)):
+        # Upsert by 'orderId': only new orders and orders whose content changed are written
+        with metrics.stage("store_upsert") as step:
+            stats = store.upsert(new_orders)
+            step.rows = stats["new"] + stats["changed"]
+            step.fields.update(stats)
+        totals = {k: totals[k] + stats[k] for k in totals}
+        if not stats["new"] and not stats["changed"]:
             continue
+        # Saved RFM states from the earliest touched date on no longer match the store
+        invalidate_states(stats["earliest"])
+        ctx.add_orders(new_orders)
+        if sheets_export_enabled():
+            append_orders_to_sheet(new_orders, ctx)
+
+    if totals["new"] or totals["changed"]:
+        print(f"✅ Orders updated ({totals['new']} novos, {totals['changed']} alterados, {totals['unchanged']} iguais).")
+    else:
+        print(f"ℹ️ No new orders ({totals['unchanged']} iguais).")
 
-        url = f"{url_base}/{customer_id}"
-        params = {"sellerid": seller_id}
 
-        try:
-            response = requests.get(url, params=params, auth=HTTPBasicAuth(username, password))
-            if response.status_code == 200:
-                client_info = response.json()
+# 📤 Send only new orders (append) and changed cells to the "Pedidos" sheet
+def append_orders_to_sheet(new_orders, ctx):
+    if new_orders.empty:
+        return
+    try:
+        rows = new_orders.assign(createdAt=new_orders["createdAt"].dt.strftime("%Y-%m-%d"))
+        stats = ctx.sync("Pedidos", "orderId").upsert_rows(rows)
+        print(f"📤 'Pedidos': {stats['appended']} linhas novas, {stats['updated_cells']} células alteradas.")
+    except Exception as e:
+        print(f"⚠️ Could not export 'Pedidos': {e}")
+
+
+# Full rewrite of "Pedidos" from the local store (rebuild/repair: python -m scripts.cli export-pedidos)
+def export_orders_to_sheet(ctx=None):
+    ctx = ctx or PipelineContext()
+    ctx.store.export_to_sheet(get_worksheet("Pedidos"))
+    print(f"📤 'Pedidos' exported to Google Sheets ({ctx.store.count()} pedidos).")
+
+
+# Re-read all of "Pedidos" into the local store, e.g. after editing the sheet by hand
+# (python -m scripts.cli import-pedidos); RFM states from the earliest touched date are dropped
+def import_orders_from_sheet(ctx=None):
+    ctx = ctx or PipelineContext()
+    stats = ctx.store.import_from_sheet(get_worksheet("Pedidos"))
+    if stats["new"] or stats["changed"]:
+        invalidate_states(stats["earliest"])
+        ctx.reload_orders()
+    print(f"📥 'Pedidos' importada ({stats['new']} novos, {stats['changed']} alterados, {stats['unchanged']} iguais).")
+    return stats
+
+
+
+# 🧍 Most recent non-null seller per customer, computed once for the seller fallback
+def latest_seller_by_customer(orders_df):
+    sellers = orders_df[orders_df["seller"].notna()].sort_values(by="createdAt", kind="stable")
+    return sellers.groupby("customerId")["seller"].last().to_dict()
+
+
+# 🧍 Check and backfill missing clients: one DataFrame per batch, so each batch can be saved
+# as soon as it arrives (an interrupted run only repeats the batches it didn't save)
+def iter_client_batches(customer_ids, client=None, batch_size=50, ctx=None):
+    client = client or MireClient()
+    ctx = ctx or PipelineContext()
+
+    seller_by_customer = latest_seller_by_customer(ctx.orders())
+
+    customer_ids = [c for c in customer_ids if not (pd.isna(c) or c in ("#N/A", "nan", ""))]
+    total_batches = (len(customer_ids) + batch_size - 1) // batch_size
+
+    done = 0
+    for batch_number, start in enumerate(range(0, len(customer_ids), batch_size), start=1):
+        batch = customer_ids[start:start + batch_size]
+        batch_start = time.perf_counter()
+        failures = []
+        clients_data = []
+
+        # Lookups in the batch run concurrently (bounded by the client's worker pool)
+        for customer_id, response in client.fetch_customers(batch):
+            done += 1
+            ctx.report("clientes", done, len(customer_ids), customer_id)
+            if response is None:
+                failures.append(customer_id)
+            elif response.status_code == 200:
+                try:
+                    client_info = response.json()
+                except ValueError as e:
+                    print(f"⚠️ Invalid JSON for client {customer_id}: {e}")
+                    failures.append(customer_id)
+                    continue
                 if isinstance(client_info, dict):
                     # 🛠️ If seller is missing, fill from Pedidos
-                    if not client_info.get("seller"):
-                        matching_seller = (
-                            orders_df[orders_df["customerId"] == customer_id]
-                            .sort_values(by="createdAt")
-                            .seller.dropna()
-                        )
-                        if not matching_seller.empty:
-                            client_info["seller"] = matching_seller.iloc[-1]  # Most recent
+                    if not client_info.get("seller") and customer_id in seller_by_customer:
+                        client_info["seller"] = seller_by_customer[customer_id]  # Most recent
 
                     clients_data.append(client_info)
                 else:
                     print(f"⚠️ Unexpected client format for {customer_id}")
+                    failures.append(customer_id)
             else:
                 print(f"❌ Failed to fetch client {customer_id}: {response.status_code}")
-        except Exception as e:
-            print(f"🚨 Error fetching client {customer_id}: {e}")
+                failures.append(customer_id)
+
+        elapsed = time.perf_counter() - batch_start
+        print(
+            f"📦 Lote {batch_number}/{total_batches}: {len(batch) - len(failures)} ok, "
+            f"{len(failures)} falhas em {elapsed:.1f}s"
+            + (f" → {', '.join(map(str, failures))}" if failures else "")
+        )
+        yield pd.DataFrame(clients_data)
 
-    return pd.DataFrame(clients_data)
 
+CLIENT_SAVE_EVERY = 500
 
-def backfill_missing_clients():
-    sheet = get_google_sheet()
-    orders = pd.DataFrame(sheet.worksheet("Pedidos").get_all_records())
-    clients = pd.DataFrame(sheet.worksheet("Clientes").get_all_records())
 
-    missing_cnpjs = set(orders["customerId"]) - set(clients["document"])
+def backfill_missing_clients(ctx=None):
+    ctx = ctx or PipelineContext()
+    orders = ctx.orders()
+    clients = ctx.frame("Clientes")
+
+    missing_cnpjs = set(orders["customerId"]) - set(to_text(clients["document"]))
     missing_cnpjs = [c for c in missing_cnpjs if pd.notna(c) and c != "#N/A"]
 
     if missing_cnpjs:
         print(f"🔍 Found {len(missing_cnpjs)} missing clients. Fetching from API...")
-        new_clients = fetch_clients_by_cnpj(list(missing_cnpjs))
-        if not new_clients.empty:
-            # Coalesce phone columns into 'whatsapp'
-            def get_best_phone(row):
-                for col in ['whatsapp', 'telefone', 'mobile']:
-                    if col in row and pd.notna(row[col]) and row[col]:
-                        return clean_phone_number(row[col])
-                return None
-
-            new_clients['whatsapp'] = new_clients.apply(get_best_phone, axis=1)
-            updated = pd.concat([clients, new_clients], ignore_index=True)
-            ws = sheet.worksheet("Clientes")
-            ws.update([updated.columns.tolist()] + updated.astype(str).values.tolist())
-            print("✅ Clients updated.")
+        # Only the new clients are appended (existing rows are left untouched), every
+        # CLIENT_SAVE_EVERY clients and on the way out, so an interrupted run keeps what it fetched
+        appended, pending = 0, []
+
+        def save_pending():
+            nonlocal appended, pending
+            if pending:
+                new_clients = pd.concat(pending, ignore_index=True)
+                # First valid number among whatsapp/telefone/mobile, in E.164
+                new_clients['whatsapp'] = contact_columns(new_clients)['whatsapp']
+                appended += ctx.sync("Clientes", "document").upsert_rows(new_clients)["appended"]
+                pending = []
+
+        try:
+            for new_clients in metrics.timed_iter("fetch_clients", iter_client_batches(list(missing_cnpjs), ctx=ctx)):
+                pending.append(new_clients)
+                if sum(len(p) for p in pending) >= CLIENT_SAVE_EVERY:
+                    save_pending()
+        finally:
+            save_pending()
+        print(f"✅ Clients updated ({appended} appended).")
     else:
         print("✅ No missing clients.")
 
 
 
-def generate_and_save_snapshot():
-    sheet = get_google_sheet()
+# 📌 Snapshot cutoff: last day of previous month
+def current_snapshot_date():
+    return datetime.today().replace(day=1) - timedelta(days=1)
+
+
+def snapshot_sheet_title(snapshot_date):
+    return f"rfm_snapshot_{snapshot_date.strftime('%Y_%m_%d')}"
 
-    # 🔄 Load orders
+
+def generate_and_save_snapshot(ctx=None):
+    ctx = ctx or PipelineContext()
+    snapshot_date = current_snapshot_date()
+    # Only orders after the last saved state cutoff are read and folded in (see snapshot_state)
     try:
-        orders = pd.DataFrame(sheet.worksheet("Pedidos").get_all_records())
-        orders.columns = orders.columns.str.strip()
-        orders["createdAt"] = pd.to_datetime(orders["createdAt"], errors="coerce")
+        with metrics.stage("rfv_snapshot") as step:
+            snapshot_df = generate_rfv_snapshot_incremental(snapshot_date, ctx.orders_since)
+            step.rows = len(snapshot_df)
     except Exception as e:
         print(f"❌ Could not load Pedidos: {e}")
         return pd.DataFrame()
 
-    # 📆 Filter last 12 months
-    # one_year_ago = datetime.today() - timedelta(days=365)
-    # df_recent = orders[orders["createdAt"] >= one_year_ago]
-
-    # 📌 Snapshot cutoff: last day of previous month
-    snapshot_date = datetime.today().replace(day=1) - timedelta(days=1)
-    snapshot_df = generate_rfv_snapshot(orders, snapshot_date)
-
     # 📥 Load client names from "Clientes"
     try:
-        clientes_df = pd.DataFrame(sheet.worksheet("Clientes").get_all_records())
+        clientes_df = ctx.frame("Clientes")
         if "document" in clientes_df.columns and "name" in clientes_df.columns:
             clientes_df = clientes_df.rename(columns={"document": "customerId"})
+            clientes_df["customerId"] = to_text(clientes_df["customerId"])
             snapshot_df = pd.merge(snapshot_df, clientes_df[["customerId", "name"]], on="customerId", how="left")
         else:
             snapshot_df["name"] = ""
@@ -238,16 +347,24 @@ def generate_and_save_snapshot():
         snapshot_df["name"] = "Erro ao buscar nome"
 
     # 📊 Save snapshot to new worksheet
-    sheet_title = f"rfm_snapshot_{snapshot_date.strftime('%Y_%m_%d')}"
+    sheet_title = snapshot_sheet_title(snapshot_date)
     try:
-        ws = sheet.worksheet(sheet_title)
-        sheet.del_worksheet(ws)
+        delete_worksheet(sheet_title)
     except:
         pass
-    ws = sheet.add_worksheet(title=sheet_title, rows="1000", cols="30")
-    snapshot_df = snapshot_df.rename(columns={"customerId": "cnpj"})
-    snapshot_df = snapshot_df[["name","cnpj","seller_name","recency","frequency","value","first_purchase_date","last_purchase_date","snapshot_day","m0_rfm","prev_recency","prev_frequency","prev_value","m1_rfm","rfm_change","change_value","message_sent"]]
-    ws.update([snapshot_df.columns.tolist()] + snapshot_df.astype(str).values.tolist())
+    ws = add_worksheet(sheet_title, rows="1000", cols="30")
+    snapshot_df = snapshot_df.rename(columns={"customerId": "cnpj"})[SNAPSHOT_COLUMNS]
+    with metrics.stage("sheets_write", sheet=sheet_title, op="update") as step:
+        ws.update(sheet_values(snapshot_df))
+        step.rows = len(snapshot_df)
+    save_snapshot_version(sheet_title, snapshot_df, ws)
+
+    # 🗃️ Keep the month in the local snapshot archive (and fill in missing past months once)
+    try:
+        archive_snapshot(snapshot_df)
+        backfill_archive(ctx.orders, snapshot_date)
+    except Exception as e:
+        print(f"⚠️ Could not update the snapshot archive: {e}")
 
     print(f"✅ Snapshot saved to sheet: {sheet_title}")
     return snapshot_df
@@ -255,8 +372,9 @@ def generate_and_save_snapshot():
 
 
 
-def update_data():
+def update_data(ctx=None):
+    ctx = ctx or PipelineContext()
     print("🔄 Verificando pedidos e clientes manualmente...")
-    backfill_orders_if_needed()
-    backfill_missing_clients()
-    print("✅ Sincronização manual concluída.")
\ No newline at end of file
+    backfill_orders_if_needed(ctx)
+    backfill_missing_clients(ctx)
+    print(f"✅ Sincronização manual concluída. ({api_call_count()} chamadas à API do Sheets neste processo)")
\ No newline at end of file
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+from scripts.storage import data_dir
+
+# ⬇️ Exportações do painel (CSV, Excel, Parquet) gravadas em disco aos pedaços, então a memória
+# usada não depende do número de linhas. Cada arquivo fica guardado por versão do snapshot
+# (snapshot_id) e filtro: o segundo download do mesmo arquivo só lê do disco.
+CHUNK_ROWS = 50_000
+# Excel aceita 1.048.576 linhas por aba (com o cabeçalho); o resto vai para abas seguintes
+XLSX_SHEET_ROWS = 1_048_575
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def exports_dir():
+    return os.path.join(data_dir(), "exports")
+
+
+def safe_name(text):
+    return re.sub(r"[^\w.-]+", "_", str(text)).strip("_") or "export"
+
+
+def version_dir(version):
+    # Readable prefix plus a digest, so different snapshot ids never share a folder
+    return os.path.join(exports_dir(), f"{safe_name(version)[:60]}-{hashlib.sha1(str(version).encode()).hexdigest()[:10]}")
+
+
+def export_path(version, name, fmt):
+    return os.path.join(version_dir(version), f"{safe_name(name)}.{fmt}")
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, path, chunk_rows=CHUNK_ROWS):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        df.iloc[:0].to_csv(f, index=False)
+        for chunk in iter_chunks(df, chunk_rows):
+            chunk.to_csv(f, index=False, header=False)
+
+
+# openpyxl em modo write_only: as linhas vão direto para o arquivo, sem montar a planilha em memória
+def write_xlsx(df, path, chunk_rows=CHUNK_ROWS, sheet_title="RFV", sheet_rows=XLSX_SHEET_ROWS):
+    wb = Workbook(write_only=True)
+    header = [str(c) for c in df.columns]
+    ws, rows_in_sheet, sheets = None, sheet_rows, 0
+    for chunk in iter_chunks(df, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if rows_in_sheet >= sheet_rows:
+                sheets += 1
+                ws = wb.create_sheet(sheet_title if sheets == 1 else f"{sheet_title} {sheets}")
+                ws.append(header)
+                rows_in_sheet = 0
+            ws.append(row)
+            rows_in_sheet += 1
+    if ws is None:
+        wb.create_sheet(sheet_title).append(header)
+    wb.save(path)
+
+
+def write_parquet(df, path, chunk_rows=CHUNK_ROWS):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+# 📄 Caminho do arquivo exportado; gera (tmp + rename) só se ainda não existe para esta versão
+def export_file(df, version, name, fmt):
+    path = export_path(version, name, fmt)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temp file per call: sessions/threads of the same process may export the same file at once
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        WRITERS[fmt](df, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def read_export(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# 🧹 Apaga exportações de versões antigas do snapshot. Pastas mexidas há menos de
+# `grace` segundos ficam (outra sessão pode ainda estar baixando a versão anterior).
+def prune_exports(current_version, grace=3600):
+    root = exports_dir()
+    if not os.path.isdir(root):
+        return
+    keep = os.path.basename(version_dir(current_version))
+    now = time.time()
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if entry != keep and now - os.path.getmtime(path) > grace:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,90 @@
+import math
+import os
+import threading
+import time
+import requests
+from scripts.storage import connect
+
+CACHE_FILE = "http_cache.sqlite"
+FOREVER = math.inf
+
+
+# 🗃️ Cache em disco das respostas da API (TTL por entrada + LRU limitado por tamanho)
+class ResponseCache:
+    def __init__(self, max_bytes=None, filename=CACHE_FILE):
+        self.max_bytes = max_bytes or int(float(os.getenv("MIRE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.conn = connect(filename, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                content_type TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+        """)
+
+    @staticmethod
+    def make_key(url, params):
+        return url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, content_type, body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, content_type, body, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response.headers["Content-Type"] = content_type or ""
+        response.headers["X-Cache"] = "HIT"
+        response.url = key
+        response.encoding = "utf-8"
+        return response
+
+    def put(self, key, response, ttl):
+        now = time.time()
+        expires_at = None if ttl == FOREVER else now + ttl
+        body = response.content
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status_code, response.headers.get("Content-Type"), body, len(body), expires_at, now)
+            )
+            self.evict()
+            self.conn.commit()
+
+    # Remove expirados e, se ainda passar do limite, os menos acessados recentemente
+    def evict(self):
+        self.conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_free = total - self.max_bytes
+        freed, stale = 0, []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            stale.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
@@ -0,0 +1,65 @@
+import os
+import time
+from scripts.storage import data_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 🔒 Trava entre processos para jobs de atualização (CLI, painel) que usam a mesma pasta de dados;
+# não vale entre máquinas (ex.: o cron do Render, que tem disco próprio). O sistema operacional
+# solta a trava quando o processo morre, então não sobra arquivo "preso" depois de uma queda.
+LOCK_FILE = "pipeline.lock"
+
+
+class LockBusy(RuntimeError):
+    pass
+
+
+class JobLock:
+    def __init__(self, name=LOCK_FILE):
+        self.path = os.path.join(data_dir(), name)
+        self.file = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self.file.seek(0)
+            holder = self.file.read().strip()
+            self.file.close()
+            self.file = None
+            raise LockBusy(f"outro job em andamento ({holder or 'desconhecido'})")
+
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(f"pid {os.getpid()} desde {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.file.flush()
+        return self
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
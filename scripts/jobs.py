@@ -0,0 +1,163 @@
+import threading
+import time
+import pandas as pd
+from scripts import metrics
+from scripts.job_lock import JobLock, LockBusy
+from scripts.storage import connect
+
+# 🧵 Jobs de atualização em segundo plano: o painel enfileira, uma thread executa e o estado
+# (etapa, progresso, erro) fica no SQLite, visível para todas as sessões e reruns.
+# A mesma JobLock do CLI garante um job por vez entre processos que usam a mesma pasta de dados
+# (RFM_DATA_DIR); o cron do Render roda em outra máquina e não é coordenado por ela.
+ACTIVE_STATUSES = ("pendente", "executando")
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes
+PENDING_TIMEOUT = 300
+_start_lock = threading.Lock()
+_live_jobs = set()  # jobs with a worker thread in this process (guarded by _start_lock)
+
+
+def now():
+    return pd.Timestamp.now().isoformat(timespec="seconds")
+
+
+class JobStore:
+    def __init__(self, conn=None):
+        self.conn = conn or connect()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                done INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                detail TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT
+            );
+        """)
+
+    def create(self, kind):
+        with self.conn:
+            return self.conn.execute(
+                "INSERT INTO jobs (kind, status, created_at) VALUES (?, 'pendente', ?)", (kind, now())
+            ).lastrowid
+
+    def get(self, job_id):
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._as_dict(row)
+
+    def latest(self):
+        return self._as_dict(self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT 1"))
+
+    def active(self):
+        return self._as_dict(self.conn.execute(
+            f"SELECT * FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))}) ORDER BY id DESC LIMIT 1",
+            ACTIVE_STATUSES
+        ))
+
+    def start(self, job_id):
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'executando', started_at = ? WHERE id = ?", (now(), job_id))
+
+    def progress(self, job_id, stage, done, total, detail=""):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET stage = ?, done = ?, total = ?, detail = ? WHERE id = ?",
+                (stage, done, total, str(detail), job_id)
+            )
+
+    def finish(self, job_id, status, error=None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, now(), job_id)
+            )
+
+    # Jobs left behind by a process that died: "executando" while nobody holds the lock, or
+    # "pendente" for longer than a thread takes to start. Jobs whose thread is alive here are
+    # skipped, and the lock is only tried when a suspect row exists, so a worker that was just
+    # started never finds it taken by this check.
+    def mark_interrupted(self, live=()):
+        stale = (pd.Timestamp.now() - pd.Timedelta(seconds=PENDING_TIMEOUT)).isoformat(timespec="seconds")
+        suspects = [job_id for (job_id,) in self.conn.execute(
+            "SELECT id FROM jobs WHERE status = 'executando' OR (status = 'pendente' AND created_at < ?)", (stale,)
+        ) if job_id not in live]
+        if not suspects:
+            return
+        try:
+            with JobLock():
+                with self.conn:
+                    self.conn.execute(
+                        f"UPDATE jobs SET status = 'interrompido', finished_at = ? "
+                        f"WHERE id IN ({', '.join('?' * len(suspects))}) AND status IN ('pendente', 'executando')",
+                        (now(), *suspects)
+                    )
+        except LockBusy:
+            pass
+
+    @staticmethod
+    def _as_dict(cursor):
+        row = cursor.fetchone()
+        return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+
+def latest_job():
+    store = JobStore()
+    try:
+        return store.latest()
+    finally:
+        store.conn.close()
+
+
+# Progress callback for PipelineContext, with at most one write every PROGRESS_INTERVAL
+# (plus the last item of each stage)
+def progress_writer(store, job_id):
+    last = {"at": 0.0}
+
+    def progress(stage, done, total, detail=""):
+        if done < total and time.monotonic() - last["at"] < PROGRESS_INTERVAL:
+            return
+        last["at"] = time.monotonic()
+        store.progress(job_id, stage, done, total, detail)
+
+    return progress
+
+
+def run_job(job_id, target, kind="job"):
+    store = JobStore()
+    try:
+        with JobLock():
+            store.start(job_id)
+            metrics.new_run(f"job{job_id}")
+            with metrics.stage(kind):
+                target(progress_writer(store, job_id))
+        store.finish(job_id, "concluído")
+    except LockBusy as e:
+        store.finish(job_id, "recusado", str(e))
+    except Exception as e:
+        store.finish(job_id, "falhou", f"{type(e).__name__}: {e}")
+    finally:
+        store.conn.close()
+        with _start_lock:
+            _live_jobs.discard(job_id)
+
+
+# ▶️ Inicia target(progress) numa thread, a menos que já exista um job ativo.
+# Devolve (id do job, True se foi iniciado agora).
+def start_job(kind, target):
+    with _start_lock:
+        store = JobStore()
+        try:
+            store.mark_interrupted(_live_jobs)
+            active = store.active()
+            if active:
+                return active["id"], False
+            job_id = store.create(kind)
+            _live_jobs.add(job_id)
+        finally:
+            store.conn.close()
+    threading.Thread(target=run_job, args=(job_id, target, kind), name=f"rfm-job-{job_id}", daemon=True).start()
+    return job_id, True
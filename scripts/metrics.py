@@ -0,0 +1,185 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+import pandas as pd
+from scripts.storage import data_dir
+
+# 📏 Medições por etapa do pipeline (duração, linhas, bytes, chamadas e retries de API).
+# Cada etapa vira uma linha JSON em data/logs/metrics.jsonl (RFM_METRICS_LOG muda o arquivo;
+# "off" desliga). Passando de RFM_METRICS_MAX_MB (padrão 20), o arquivo vira metrics.jsonl.1
+# (substituindo o anterior) e um novo começa. Os contadores de chamadas são do processo inteiro:
+# uma etapa registra o quanto eles andaram enquanto ela rodava (inclui buscas feitas em paralelo
+# por outras threads).
+COUNTER_NAMES = ["sheets_calls", "sheets_bytes", "api_calls", "api_bytes", "api_retries", "api_cache_hits"]
+TAIL_BYTES = 512 * 1024
+
+counters = Counter()
+recent = deque(maxlen=500)
+_lock = threading.Lock()
+_run = contextvars.ContextVar("rfm_metrics_run", default=None)
+_parent = contextvars.ContextVar("rfm_metrics_stage", default=None)
+
+
+def count(**amounts):
+    with _lock:
+        counters.update(amounts)
+
+
+def counter_values():
+    with _lock:
+        return {name: counters[name] for name in COUNTER_NAMES}
+
+
+def log_path():
+    path = os.getenv("RFM_METRICS_LOG")
+    if path and path.lower() in ("0", "off", "false", "no"):
+        return None
+    return path or os.path.join(data_dir(), "logs", "metrics.jsonl")
+
+
+def max_log_bytes():
+    return int(float(os.getenv("RFM_METRICS_MAX_MB", "20")) * 1e6)
+
+
+# Keeps one previous file, so the log takes at most about twice the limit on disk
+def rotate_if_large(path):
+    try:
+        if os.path.getsize(path) >= max_log_bytes():
+            os.replace(path, f"{path}.1")
+    except FileNotFoundError:
+        pass
+
+
+def write(record):
+    recent.append(record)
+    path = log_path()
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _lock:
+            rotate_if_large(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar métricas em {path}: {e}")
+
+
+# ▶️ Marca o início de uma execução (CLI, job do painel, rerun); as etapas seguintes levam o id
+def new_run(kind):
+    run_id = f"{kind}-{uuid.uuid4().hex[:8]}"
+    _run.set(run_id)
+    return run_id
+
+
+# ⏱️ Etapa medida: `with stage("sheets_read", sheet="Clientes") as s: ...; s.rows = len(df)`.
+# Também pode ser usada sem with (start()/finish()) quando o fim não cabe num bloco.
+class Stage:
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.rows = None
+
+    def start(self):
+        self.parent = _parent.get()
+        self._token = _parent.set(self.name)
+        self.started_at = pd.Timestamp.now().isoformat(timespec="milliseconds")
+        self.before = counter_values()
+        self.started = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        elapsed = time.perf_counter() - self.started
+        after = counter_values()
+        try:
+            _parent.reset(self._token)
+        except ValueError:  # finished from another context (e.g. a generator resumed elsewhere)
+            pass
+        record = {
+            "ts": self.started_at,
+            "run": _run.get(),
+            "stage": self.name,
+            "parent": self.parent,
+            "seconds": round(elapsed, 4),
+            "rows": self.rows,
+            "status": "ok" if error is None else "erro",
+            **{name: after[name] - self.before[name] for name in COUNTER_NAMES},
+            **self.fields,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        write(record)
+        return record
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        # Control flow that is not an Exception (st.stop(), st.rerun(), SystemExit) ends the stage normally
+        self.finish(exc if isinstance(exc, Exception) else None)
+        return False
+
+
+def stage(name, **fields):
+    return Stage(name, **fields)
+
+
+# 🔁 Mede o tempo gasto em cada next() de um gerador (ex.: um lote buscado na API),
+# sem contar o que quem consome faz com o item
+def timed_iter(name, iterable, **fields):
+    iterator = iter(iterable)
+    while True:
+        step = stage(name, **fields).start()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception as e:
+            step.finish(e)
+            raise
+        step.rows = len(item) if hasattr(item, "__len__") else None
+        step.finish()
+        yield item
+
+
+# 📖 Últimas medições gravadas (de todos os processos que usam este log: painel, jobs, CLI)
+def read_recent(limit=300):
+    path = log_path()
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame(list(recent)[-limit:])
+    offset = max(os.path.getsize(path) - TAIL_BYTES, 0)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    if offset:
+        lines = lines[1:]  # first line is probably cut
+    records = []
+    for line in lines[-limit:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return pd.DataFrame(records)
+
+
+# 📊 Resumo por etapa: execuções, tempo total/médio/máximo, linhas, bytes e chamadas
+def stage_summary(records):
+    if records.empty:
+        return records
+    for name in COUNTER_NAMES + ["rows"]:
+        if name not in records.columns:
+            records[name] = 0
+    summary = records.groupby("stage").agg(
+        execucoes=("seconds", "count"),
+        total_s=("seconds", "sum"),
+        media_s=("seconds", "mean"),
+        max_s=("seconds", "max"),
+        linhas=("rows", "sum"),
+        **{name: (name, "sum") for name in COUNTER_NAMES},
+    )
+    return summary.sort_values("total_s", ascending=False).round(3)
@@ -0,0 +1,126 @@
+import os
+import random
+import time
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from scripts import metrics
+from scripts.http_cache import FOREVER, ResponseCache
+
+load_dotenv("config/.env")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def cache_enabled():
+    return os.getenv("MIRE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+# 🌐 Cliente da API Mire: sessão com pool de conexões, retry com backoff e busca concorrente
+class MireClient:
+    def __init__(self, base_url=None, max_workers=None, max_retries=4, backoff=0.5, timeout=30, cache=None):
+        self.base_url = (base_url or os.getenv("MIRE_API_BASE_URL", "https://mire.omnni.com.br/api")).rstrip("/")
+        self.seller_id = os.getenv("API_SELLER_ID") or os.getenv("MIRE_API_SELLER_ID")
+        self.max_workers = max_workers or int(os.getenv("MIRE_API_CONCURRENCY", "4"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache if cache is not None else (ResponseCache() if cache_enabled() else None)
+        self.today_ttl = float(os.getenv("MIRE_CACHE_TODAY_TTL", "600"))
+        self.customer_ttl = float(os.getenv("MIRE_CACHE_CUSTOMER_TTL", "86400"))
+
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(os.getenv("API_USERNAME"), os.getenv("API_PASSWORD"))
+        self.session.headers["Accept"] = "application/json"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt) * (1 + random.random() / 2)
+
+    # GET com cache opcional (ttl em segundos, FOREVER ou 0 = sem cache)
+    def get(self, path, params=None, ttl=0):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = {"sellerid": self.seller_id, **(params or {})}
+        if not ttl or not self.cache:
+            return self.request(url, params, path)
+
+        key = self.cache.make_key(url, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.count(api_cache_hits=1)
+            return cached
+        response = self.request(url, params, path)
+        if response.status_code == 200:
+            self.cache.put(key, response, ttl)
+        return response
+
+    # GET com retry em 429/5xx e erros de conexão; devolve a última resposta
+    def request(self, url, params, path):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                metrics.count(api_calls=1, api_bytes=len(response.content))
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.count(api_calls=1)
+                if attempt == self.max_retries:
+                    raise
+                metrics.count(api_retries=1)
+                time.sleep(self.retry_delay(attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            metrics.count(api_retries=1)
+            print(f"⏳ {response.status_code} em {path}, tentando de novo ({attempt + 1}/{self.max_retries})")
+            time.sleep(self.retry_delay(attempt, response))
+
+    # Executa fn sobre items com no máximo max_workers requisições simultâneas (ordem preservada).
+    # Só uma janela de 2 * max_workers resultados fica pendente, então a memória não cresce
+    # com o número de items quando quem consome é mais lento.
+    def map_concurrent(self, fn, items):
+        window = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def fetch_orders_day(self, day):
+        try:
+            # Past days are closed and cached forever; today (or later) only briefly
+            ttl = FOREVER if day.date() < date.today() else self.today_ttl
+            return day, self.get("orders", {"data": day.strftime("%Y-%m-%d")}, ttl=ttl)
+        except requests.RequestException as e:
+            print(f"🚨 Error fetching orders for {day.strftime('%Y-%m-%d')}: {e}")
+            return day, None
+
+    # 📅 Busca vários dias em paralelo; resultados em ordem de data
+    def fetch_orders(self, start_date, end_date):
+        days = []
+        current_date = start_date
+        while current_date <= end_date:
+            days.append(current_date)
+            current_date += timedelta(days=1)
+        yield from self.map_concurrent(self.fetch_orders_day, days)
+
+    def fetch_customer(self, customer_id):
+        try:
+            return customer_id, self.get(f"customers/{customer_id}", ttl=self.customer_ttl)
+        except requests.RequestException as e:
+            print(f"🚨 Error fetching client {customer_id}: {e}")
+            return customer_id, None
+
+    # 🧍 Busca vários clientes em paralelo; resultados na ordem dos IDs
+    def fetch_customers(self, customer_ids):
+        yield from self.map_concurrent(self.fetch_customer, customer_ids)
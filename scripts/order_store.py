@@ -0,0 +1,191 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from scripts.storage import connect
+
+# 📦 Colunas tipadas do banco local de pedidos; o resto do payload da API vai em "extra" (JSON)
+ORDER_COLUMNS = {
+    "orderId": "TEXT PRIMARY KEY",
+    "customerId": "TEXT",
+    "createdAt": "TEXT",
+    "seller": "TEXT",
+    "netValue": "REAL",
+    "status": "TEXT",
+    "loja": "TEXT",
+}
+TEXT_COLUMNS = ["orderId", "customerId", "seller", "status", "loja"]
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def to_text(series):
+    # Sheets devolve CNPJs/IDs numéricos como int; no banco tudo vira texto sem ".0"
+    return series.map(lambda v: None if pd.isna(v) or v == "" else str(int(v)) if isinstance(v, float) and v.is_integer() else str(v))
+
+
+# 🧾 Normaliza o JSON de um dia da API para o esquema fixo (colunas tipadas primeiro)
+def normalize_orders(records):
+    df = pd.DataFrame.from_records(records) if records else pd.DataFrame(columns=list(ORDER_COLUMNS))
+    df.columns = df.columns.str.strip()
+    for col in ORDER_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    for col in TEXT_COLUMNS:
+        df[col] = to_text(df[col])
+    df["createdAt"] = pd.to_datetime(df["createdAt"], errors="coerce").dt.normalize()
+    df["netValue"] = pd.to_numeric(df["netValue"], errors="coerce").astype("float64")
+    return df[list(ORDER_COLUMNS) + [c for c in df.columns if c not in ORDER_COLUMNS]]
+
+
+# #️⃣ Hash (int64) do conteúdo gravado de cada linha: colunas tipadas + JSON do "extra".
+# Mesmo pedido com o mesmo conteúdo -> mesmo hash, venha da API, da planilha ou do banco.
+def content_hashes(rows):
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy().view("int64")
+
+
+class OrderStore:
+    def __init__(self, conn=None):
+        self.conn = conn or connect()
+        columns = ",\n                ".join(f"{name} {kind}" for name, kind in ORDER_COLUMNS.items())
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS orders (
+                {columns},
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_orders_createdAt ON orders (createdAt);
+            CREATE INDEX IF NOT EXISTS idx_orders_customerId ON orders (customerId);
+        """)
+        # Stores created before content hashes: add the column and hash what is already there
+        if "content_hash" not in {row[1] for row in self.conn.execute("PRAGMA table_info(orders)")}:
+            with self.conn:
+                self.conn.execute("ALTER TABLE orders ADD COLUMN content_hash INTEGER")
+            self.backfill_hashes()
+
+    def backfill_hashes(self, batch_size=50000):
+        stored_columns = list(ORDER_COLUMNS) + ["extra"]
+        while True:
+            rows = pd.read_sql_query(
+                f"SELECT rowid, {', '.join(stored_columns)} FROM orders WHERE content_hash IS NULL LIMIT ?",
+                self.conn, params=(batch_size,)
+            )
+            if rows.empty:
+                return
+            hashes = content_hashes(rows[stored_columns].astype(object).where(rows[stored_columns].notna(), None))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE orders SET content_hash = ? WHERE rowid = ?",
+                    zip(hashes.tolist(), rows["rowid"].tolist())
+                )
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def last_order_date(self):
+        value = self.conn.execute("SELECT MAX(createdAt) FROM orders").fetchone()[0]
+        return pd.Timestamp(value) if value else None
+
+    # 🔎 Pedidos com createdAt em (since, until]; colunas tipadas (datetime, float)
+    def read(self, since=None, until=None, columns=None, include_extra=False):
+        selected = list(columns or ORDER_COLUMNS)
+        if include_extra:
+            selected.append("extra")
+        where, params = [], []
+        if since is not None:
+            where.append("createdAt > ?")
+            params.append(pd.Timestamp(since).strftime(DATE_FORMAT))
+        if until is not None:
+            where.append("createdAt <= ?")
+            params.append(pd.Timestamp(until).strftime(DATE_FORMAT))
+        query = f"SELECT {', '.join(selected)} FROM orders"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        df = pd.read_sql_query(query + " ORDER BY createdAt, rowid", self.conn, params=params)
+
+        if "createdAt" in df.columns:
+            df["createdAt"] = pd.to_datetime(df["createdAt"], errors="coerce")
+        if "netValue" in df.columns:
+            df["netValue"] = df["netValue"].astype(float)
+        if include_extra:
+            extra = pd.DataFrame([json.loads(e) if e else {} for e in df.pop("extra")], index=df.index)
+            df = df.join(extra[[c for c in extra.columns if c not in df.columns]])
+        return df
+
+    # 📝 Insere/atualiza pedidos por orderId (o último recebido vence). Cada pedido é
+    # classificado pelo índice de orderId + hash do conteúdo: novo, alterado ou igual;
+    # só novos e alterados são gravados. Devolve {"new", "changed", "unchanged", "earliest"},
+    # onde earliest é a menor data (AAAA-MM-DD) afetada pelos gravados, antes ou depois da
+    # alteração: estados RFM salvos a partir dela ficaram desatualizados (ver snapshot_state).
+    def upsert(self, orders):
+        stats = {"new": 0, "changed": 0, "unchanged": 0, "earliest": None}
+        if orders.empty:
+            return stats
+        orders = orders[orders["orderId"].notna() & (orders["orderId"] != "")]
+        typed = pd.DataFrame(index=orders.index)
+        for col in TEXT_COLUMNS:
+            typed[col] = to_text(orders[col]) if col in orders.columns else None
+        typed["createdAt"] = pd.to_datetime(orders["createdAt"], errors="coerce").dt.strftime(DATE_FORMAT)
+        typed["netValue"] = pd.to_numeric(orders["netValue"], errors="coerce").astype("float64") if "netValue" in orders.columns else None
+        typed = typed[list(ORDER_COLUMNS)].astype(object).where(typed[list(ORDER_COLUMNS)].notna(), None)
+
+        extra_cols = [c for c in orders.columns if c not in ORDER_COLUMNS]
+        extras = orders[extra_cols].astype(object).where(orders[extra_cols].notna(), None).to_dict("records") if extra_cols else [None] * len(typed)
+        typed["extra"] = [json.dumps(extra, default=str, ensure_ascii=False) if extra else None for extra in extras]
+        typed = typed[~typed["orderId"].duplicated(keep="last")]
+        typed["content_hash"] = content_hashes(typed)
+
+        # Plain lists: a NaN in a mapped Series would turn the 64-bit hashes into floats
+        stored = self.stored_rows(typed["orderId"])
+        previous = [stored.get(order_id, (None, None)) for order_id in typed["orderId"]]
+        is_new = ~typed["orderId"].isin(list(stored)).to_numpy()
+        changed = ~is_new & np.array([p[0] != h for p, h in zip(previous, typed["content_hash"].tolist())], dtype=bool)
+        stats.update(new=int(is_new.sum()), changed=int(changed.sum()), unchanged=int((~is_new & ~changed).sum()))
+
+        write = typed[is_new | changed]
+        # Dates touched by the write: the new createdAt of every written row and the old one of changed rows
+        touched = write["createdAt"].dropna().tolist()
+        touched += [p[1] for p, c in zip(previous, changed) if c and p[1]]
+        stats["earliest"] = min(touched, default=None)
+        if not write.empty:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO orders ({', '.join(write.columns)}) "
+                    f"VALUES ({', '.join('?' * len(write.columns))})",
+                    write.itertuples(index=False)
+                )
+        return stats
+
+    # orderId -> (hash, createdAt) gravados, só para os ids recebidos (join com tabela temporária, O(delta))
+    def stored_rows(self, order_ids):
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_order_ids (orderId PRIMARY KEY)")
+        self.conn.execute("DELETE FROM incoming_order_ids")
+        self.conn.executemany("INSERT OR IGNORE INTO incoming_order_ids VALUES (?)", ((o,) for o in order_ids))
+        rows = self.conn.execute(
+            "SELECT o.orderId, o.content_hash, o.createdAt FROM orders o JOIN incoming_order_ids i ON i.orderId = o.orderId"
+        )
+        return {order_id: (content_hash, created_at) for order_id, content_hash, created_at in rows}
+
+    # 📤 Exportação opcional para a aba "Pedidos" (datas como texto, como a planilha espera)
+    def export_to_sheet(self, ws):
+        df = self.read(include_extra=True)
+        df["createdAt"] = df["createdAt"].dt.strftime(DATE_FORMAT)
+        df = df.astype(object).where(df.notna(), "")
+        ws.update([df.columns.tolist()] + df.values.tolist())
+
+    # 📥 Migração única: carrega o histórico existente da aba "Pedidos"
+    def import_from_sheet(self, ws):
+        return self.import_frame(pd.DataFrame(ws.get_all_records(numericise_ignore=["all"])))
+
+    def import_frame(self, existing):
+        if existing.empty:
+            return {"new": 0, "changed": 0, "unchanged": 0, "earliest": None}
+        existing = existing.rename(columns=str.strip)
+        return self.upsert(existing)
+
+
+def sheets_export_enabled():
+    return os.getenv("EXPORT_ORDERS_TO_SHEETS", "1").lower() not in ("0", "false", "no")
+
+
+def get_order_store():
+    # New connection per call: SQLite connections can't be shared across Streamlit threads
+    return OrderStore(connect())
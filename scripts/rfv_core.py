@@ -1,93 +1,225 @@
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from datetime import timedelta
+from scripts.order_store import to_text
 
 load_dotenv("config/.env")
 
 
+RFM_ORDER = [
+    "Campeões", "Leais", "Potenciais Leais", "Recentes", "Promissores",
+    "Precisam Atenção", "Não pode perdê-los", "Em risco",
+    "Prestes a dormir", "Hibernando", "Perdidos"
+]
+SEGMENT_CATEGORIES = RFM_ORDER + ["Outros", "Sem histórico"]
+SEGMENT_DTYPE = pd.CategoricalDtype(SEGMENT_CATEGORIES, ordered=True)
+OTHER_CODE = SEGMENT_CATEGORIES.index("Outros")
+
+# 📐 Esquema do snapshot (ordem das colunas da aba rfm_snapshot_*): segmentos e vendedora como
+# categorias, inteiros reduzidos (nulos viram Int16/Int32), datas em datetime64
+SNAPSHOT_COLUMNS = [
+    "name", "cnpj", "seller_name", "recency", "frequency", "value", "first_purchase_date",
+    "last_purchase_date", "snapshot_day", "m0_rfm", "prev_recency", "prev_frequency",
+    "prev_value", "m1_rfm", "rfm_change", "change_value", "message_sent"
+]
+SNAPSHOT_DTYPES = {
+    "seller_name": "category",
+    "recency": "int16",
+    "frequency": "int32",
+    "value": "float64",
+    "first_purchase_date": "datetime64[ns]",
+    "last_purchase_date": "datetime64[ns]",
+    "snapshot_day": "datetime64[ns]",
+    "m0_rfm": SEGMENT_DTYPE,
+    "prev_recency": "int16",
+    "prev_frequency": "int32",
+    "prev_value": "float64",
+    "m1_rfm": SEGMENT_DTYPE,
+    "rfm_change": "bool",
+    "change_value": "float64",
+    "message_sent": "bool",
+}
+
+
+# 🧮 Motor de segmentação vetorizado: recência/frequência -> códigos de segmento
+def segment_codes(recency, frequency):
+    r = np.asarray(recency, dtype=float)
+    f = np.asarray(frequency, dtype=float)
+    # Same precedence as the original if/elif chain, one condition per RFM_ORDER entry
+    conditions = [
+        (r <= 30) & (f >= 10),
+        (r > 30) & (r <= 120) & (f >= 10),
+        (r <= 60) & (f >= 2) & (f <= 9),
+        (r <= 30) & (f == 1),
+        (r > 30) & (r <= 60) & (f == 1),
+        (r > 60) & (r <= 120) & (f >= 2) & (f <= 9),
+        (r > 120) & (r <= 360) & (f >= 10),
+        (r > 120) & (r <= 180) & (f >= 2) & (f <= 9),
+        (r > 60) & (r <= 180) & (f == 1),
+        (r > 180) & (r <= 360) & (f >= 1) & (f <= 9),
+        r > 360,
+    ]
+    return np.select(conditions, np.arange(len(conditions)), default=OTHER_CODE).astype(np.int8)
+
+
+def segment_array(recency, frequency):
+    return pd.Categorical.from_codes(segment_codes(recency, frequency), dtype=SEGMENT_DTYPE)
+
+
+# 🧱 Aplica SNAPSHOT_DTYPES (vale para o snapshot recém-calculado e para o lido da planilha,
+# onde tudo chega como texto/número solto: "TRUE", "", "2025-06-30 00:00:00"...)
+def typed_snapshot(df):
+    df = df.copy()
+    if "cnpj" in df.columns and not pd.api.types.is_string_dtype(df["cnpj"]):
+        df["cnpj"] = to_text(df["cnpj"])
+    for col, dtype in SNAPSHOT_DTYPES.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        values = df[col]
+        if not isinstance(dtype, str) or dtype == "category":
+            df[col] = values.where(values != "").astype(dtype)
+        elif dtype == "bool":
+            df[col] = values if values.dtype == bool else values.astype(str).str.lower().isin(["true", "1"])
+        elif dtype.startswith("datetime64"):
+            df[col] = pd.to_datetime(values, format="ISO8601", errors="coerce").astype(dtype)
+        elif dtype.startswith("int"):
+            numbers = pd.to_numeric(values, errors="coerce")
+            # Missing values (e.g. prev_* for new customers) need the nullable integer type
+            df[col] = numbers.astype(dtype if numbers.notna().all() else dtype.capitalize())
+        else:
+            df[col] = pd.to_numeric(values, errors="coerce").astype(dtype)
+    return df
+
+
 def segment(row):
-    r = row['recency']
-    f = row['frequency']
-    if r <= 30 and f >= 10:
-        return 'Campeões'
-    elif 30 < r <= 120 and f >= 10:
-        return 'Leais'
-    elif r <= 60 and 2 <= f <= 9:
-        return 'Potenciais Leais'
-    elif r <= 30 and f == 1:
-        return 'Recentes'
-    elif 30 < r <= 60 and f == 1:
-        return 'Promissores'
-    elif 60 < r <= 120 and 2 <= f <= 9:
-        return 'Precisam Atenção'
-    elif 120 < r <= 360 and f >= 10:
-        return 'Não pode perdê-los'
-    elif 120 < r <= 180 and 2 <= f <= 9:
-        return 'Em risco'
-    elif 60 < r <= 180 and f == 1:
-        return 'Prestes a dormir'
-    elif 180 < r <= 360 and 1 <= f <= 9:
-        return 'Hibernando'
-    elif r > 360:
-        return 'Perdidos'
-    else:
-        return 'Outros'
-    
-    
-def generate_rfv_snapshot(df, snapshot_date):
-    df['createdAt'] = pd.to_datetime(df['createdAt'])
-    df = df.sort_values(by='createdAt')
+    return SEGMENT_CATEGORIES[segment_codes([row['recency']], [row['frequency']])[0]]
 
-    # Current snapshot range
-    # one_year_ago = snapshot_date - timedelta(days=365)
-    current_df = df[df['createdAt'] <= snapshot_date]
-    # current_df = current_df[current_df['createdAt'] >= one_year_ago]
 
-    # Last month snapshot
-    prev_snapshot_date = snapshot_date.replace(day=1) - timedelta(days=1)
-    # one_year_before_prev = prev_snapshot_date - timedelta(days=365)
-    previous_df = df[df['createdAt'] <= prev_snapshot_date]
-    # previous_df = previous_df[previous_df['createdAt'] >= one_year_before_prev]
-
-    # Group current
-    current_group = current_df.groupby(['customerId']).agg(
-        seller_name=('seller', lambda x: x.dropna().iloc[-1] if not x.dropna().empty else None),
-        recency=('createdAt', lambda x: (snapshot_date - x.max()).days),
+def month_end_cutoffs(snapshot_date, months):
+    # snapshot_date plus the (months - 1) previous month-ends, oldest first
+    cutoffs = [snapshot_date]
+    for _ in range(months - 1):
+        cutoffs.append(cutoffs[-1].replace(day=1) - timedelta(days=1))
+    return cutoffs[::-1]
+
+
+AGGREGATE_COLUMNS = ['cutoff', 'customerId', 'seller_name', 'frequency', 'value', 'first_purchase_date', 'last_purchase_date']
+
+
+# 📦 Agregados por cliente para vários cortes numa única passada pelos pedidos
+def customer_aggregates(df, cutoffs):
+    cutoffs = sorted(cutoffs)
+    n_cutoffs = len(cutoffs)
+    created = pd.to_datetime(df['createdAt'])
+    date_dtype = created.to_numpy().dtype
+    created_i8 = created.to_numpy().view('i8')
+
+    # Bucket b holds the orders in (cutoffs[b-1], cutoffs[b]]; later orders fall outside
+    bounds = np.array(cutoffs, dtype=date_dtype).view('i8')
+    bucket = np.searchsorted(bounds, created_i8, side='left')
+    valid = created.notna().to_numpy() & (bucket < n_cutoffs) & df['customerId'].notna().to_numpy()
+
+    cust_codes, customers = pd.factorize(df['customerId'][valid], sort=True)
+    seller_codes, seller_labels = pd.factorize(df['seller'][valid])
+    n_slots = len(customers) * n_cutoffs
+    frame = pd.DataFrame({
+        'slot': cust_codes * n_cutoffs + bucket[valid],
+        'createdAt': created_i8[valid],
+        'netValue': df['netValue'].to_numpy()[valid],
+        'seller': seller_codes,
+    })
+
+    per_bucket = frame.groupby('slot').agg(
         frequency=('createdAt', 'count'),
         value=('netValue', 'sum'),
-        first_purchase_date=('createdAt', 'min'),
-        last_purchase_date=('createdAt', 'max')
-    ).reset_index()
+        first=('createdAt', 'min'),
+        last=('createdAt', 'max')
+    )
+    slots = per_bucket.index.to_numpy()
 
-    # current_group.columns = current_group.columns.str.lower()
-    current_group['snapshot_day'] = snapshot_date.strftime('%Y-%m-%d')
-    current_group['m0_rfm'] = current_group.apply(segment, axis=1)
+    def dense(values, fill, dtype):
+        out = np.full(n_slots, fill, dtype=dtype)
+        out[slots] = values
+        return out.reshape(-1, n_cutoffs)
+
+    # Cumulative reductions across buckets give the aggregate as of each cutoff
+    frequency = np.cumsum(dense(per_bucket['frequency'], 0, np.int64), axis=1)
+    value = np.cumsum(dense(per_bucket['value'], 0.0, np.float64), axis=1)
+    first = np.minimum.accumulate(dense(per_bucket['first'], np.iinfo(np.int64).max, np.int64), axis=1)
+    last = np.maximum.accumulate(dense(per_bucket['last'], np.iinfo(np.int64).min, np.int64), axis=1)
+
+    # Last non-null seller: the one on the latest order of the bucket (ties -> later row),
+    # carried forward to following cutoffs
+    sellers = frame[frame['seller'] >= 0]
+    at_last = sellers['createdAt'] == sellers.groupby('slot')['createdAt'].transform('max')
+    bucket_seller = sellers[at_last].groupby('slot')['seller'].last()
+    seller_code = np.full(n_slots, -1, dtype=np.int64)
+    seller_code[bucket_seller.index.to_numpy()] = bucket_seller.to_numpy()
+    seller_slot = np.where(seller_code >= 0, np.arange(n_slots), -1)
+    seller_slot = np.maximum.accumulate(seller_slot.reshape(-1, n_cutoffs), axis=1)
+    seller_code = np.where(seller_slot >= 0, seller_code[np.maximum(seller_slot, 0)], -1)
+
+    # Cutoff-major, customerId-sorted rows for every customer with at least one order
+    bucket_idx, cust_idx = np.nonzero(frequency.T > 0)
+    return pd.DataFrame({
+        'cutoff': np.asarray(cutoffs, dtype=object)[bucket_idx],
+        'customerId': pd.Categorical.from_codes(cust_idx, customers),
+        'seller_name': pd.Categorical.from_codes(seller_code[cust_idx, bucket_idx], seller_labels).astype(seller_labels.dtype),
+        'frequency': frequency[cust_idx, bucket_idx],
+        'value': value[cust_idx, bucket_idx],
+        'first_purchase_date': first[cust_idx, bucket_idx].view(date_dtype),
+        'last_purchase_date': last[cust_idx, bucket_idx].view(date_dtype),
+    }, columns=AGGREGATE_COLUMNS)
 
-    # Group previous
-    previous_group = previous_df.groupby(['customerId']).agg(
-        recency=('createdAt', lambda x: (prev_snapshot_date - x.max()).days),
-        frequency=('createdAt', 'count'),
-        value=('netValue', 'sum')
-    ).reset_index()
 
-    previous_group.columns = ['customerId', 'prev_recency', 'prev_frequency', 'prev_value']
-    previous_group['m1_rfm'] = previous_group.apply(lambda row: segment({
-        'recency': row['prev_recency'], 'frequency': row['prev_frequency']
-    }), axis=1)
+def build_snapshot(aggregates, snapshot_date, prev_snapshot_date):
+    current_group = aggregates[aggregates['cutoff'] == snapshot_date].drop(columns='cutoff').reset_index(drop=True)
+    current_group.insert(2, 'recency', (snapshot_date - current_group['last_purchase_date']).dt.days)
 
-    # Merge previous into current
+    # current_group.columns = current_group.columns.str.lower()
+    current_group['snapshot_day'] = pd.Timestamp(snapshot_date.strftime('%Y-%m-%d'))
+    current_group['m0_rfm'] = segment_array(current_group['recency'], current_group['frequency'])
+
+    previous = aggregates[aggregates['cutoff'] == prev_snapshot_date]
+    previous_group = pd.DataFrame({
+        'customerId': previous['customerId'],
+        'prev_recency': (prev_snapshot_date - previous['last_purchase_date']).dt.days,
+        'prev_frequency': previous['frequency'],
+        'prev_value': previous['value'],
+    })
+    previous_group['m1_rfm'] = segment_array(previous_group['prev_recency'], previous_group['prev_frequency'])
+
+    # Merge previous into current (categorical keys share categories, so this joins on codes)
     merged = pd.merge(current_group, previous_group, on=['customerId'], how='left')
+    merged['customerId'] = merged['customerId'].astype(merged['customerId'].cat.categories.dtype)
 
     merged['m1_rfm'] = merged['m1_rfm'].fillna('Sem histórico')
     merged['rfm_change'] = merged['m0_rfm'] != merged['m1_rfm']
-    merged['change_value'] = merged.apply(
-        lambda row: row['prev_value'] - row['value']  if row['rfm_change'] and not pd.isna(row['prev_value']) else 0.0,
-        axis=1
+    merged['change_value'] = np.where(
+        merged['rfm_change'] & merged['prev_value'].notna(),
+        merged['prev_value'] - merged['value'],
+        0.0
     )
     merged['message_sent'] = False
     merged['message_timestamp'] = ''
     merged['message_by'] = ''
 
-    return merged
+    return typed_snapshot(merged)
+
+
+def generate_rfv_snapshot(df, snapshot_date):
+    # Last month snapshot
+    prev_snapshot_date = snapshot_date.replace(day=1) - timedelta(days=1)
+    aggregates = customer_aggregates(df, [prev_snapshot_date, snapshot_date])
+    return build_snapshot(aggregates, snapshot_date, prev_snapshot_date)
 
 
+# 🗓️ Snapshots de vários meses (ex.: backfill de 12 meses) a partir da mesma passada
+def generate_rfv_history(df, snapshot_date, months=12):
+    cutoffs = month_end_cutoffs(snapshot_date, months + 1)
+    aggregates = customer_aggregates(df, cutoffs)
+    return {
+        cutoff: build_snapshot(aggregates, cutoff, prev_cutoff)
+        for prev_cutoff, cutoff in zip(cutoffs, cutoffs[1:])
+    }
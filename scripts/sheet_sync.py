@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+from scripts import metrics
+from scripts.order_store import to_text
+from scripts.sheets import read_records
+
+
+# 🔣 Valor de célula para a API (tipos numpy/pandas viram tipos Python; datas sem hora viram AAAA-MM-DD)
+def cell_value(value):
+    if not isinstance(value, (list, dict, tuple)) and pd.isna(value):
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else value.isoformat()
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+# 📋 Frame -> linhas para ws.update: datas como texto (sem hora quando são só datas), vazios como ""
+def sheet_values(df):
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            dates = df[col]
+            date_only = (dates.dropna() == dates.dropna().dt.normalize()).all()
+            df[col] = dates.dt.strftime("%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S")
+    df = df.astype(object).where(df.notna(), "")
+    return [df.columns.tolist()] + df.values.tolist()
+
+
+# Comparação tolerante ao que get_all_records devolve ("TRUE" x True, 12 x "12.0", None x "")
+def comparable(value):
+    value = cell_value(value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, str):
+        if value.lower() in ("true", "false"):
+            return value.lower()
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return float(value)
+
+
+# 🔄 Sincronização por diferença com uma aba: compara com a cópia em cache e envia só
+# linhas novas (append_rows) e células alteradas (batch_update com intervalos exatos)
+class SheetSync:
+    def __init__(self, ws, key, frame=None):
+        self.ws = ws
+        self.key = key
+        frame = frame if frame is not None else pd.DataFrame(read_records(ws))
+        self.frame = frame.astype(object).reset_index(drop=True)
+        self.positions = {}
+        if key in self.frame.columns:
+            self.positions = {k: i for i, k in enumerate(to_text(self.frame[key]))}
+
+    def upsert_rows(self, df):
+        stats = {"appended": 0, "updated_cells": 0, "ranges": 0}
+        if df.empty:
+            return stats
+
+        data = []
+        header = list(self.frame.columns)
+        new_columns = [c for c in df.columns if c not in header]
+        if new_columns:
+            data.append({
+                "range": f"{rowcol_to_a1(1, len(header) + 1)}:{rowcol_to_a1(1, len(header) + len(new_columns))}",
+                "values": [new_columns],
+            })
+            for col in new_columns:
+                self.frame[col] = ""
+            header += new_columns
+        col_index = {c: i for i, c in enumerate(header)}
+
+        df = df.drop_duplicates(subset=self.key, keep="last")
+        appended, changed = [], []
+        for key, record in zip(to_text(df[self.key]), df.to_dict("records")):
+            pos = self.positions.get(key)
+            if pos is None:
+                self.positions[key] = len(self.frame) + len(appended)
+                appended.append([cell_value(record.get(c)) for c in header])
+                continue
+
+            # Changed cells of this row, grouped into runs of adjacent columns
+            cols = sorted(
+                col_index[c] for c, v in record.items()
+                if comparable(self.frame.iat[pos, col_index[c]]) != comparable(v)
+            )
+            runs = []
+            for ci in cols:
+                if runs and ci == runs[-1][-1] + 1:
+                    runs[-1].append(ci)
+                else:
+                    runs.append([ci])
+            for run in runs:
+                values = [cell_value(record[header[ci]]) for ci in run]
+                data.append({
+                    "range": f"{rowcol_to_a1(pos + 2, run[0] + 1)}:{rowcol_to_a1(pos + 2, run[-1] + 1)}",
+                    "values": [values],
+                })
+                changed.extend((pos, ci, v) for ci, v in zip(run, values))
+
+        if data or appended:
+            with metrics.stage("sheets_write", sheet=self.ws.title, op="upsert") as step:
+                if data:
+                    self.ws.batch_update(data, value_input_option="RAW")
+                if appended:
+                    self.ws.append_rows(appended, value_input_option="RAW")
+                step.rows = len(appended) + len({pos for pos, _, _ in changed})
+
+        # Keep the cached copy in step with the sheet
+        for pos, ci, value in changed:
+            self.frame.iat[pos, ci] = value
+        if appended:
+            self.frame = pd.concat([self.frame, pd.DataFrame(appended, columns=header)], ignore_index=True)
+
+        stats.update(appended=len(appended), updated_cells=len(changed), ranges=len(data))
+        return stats
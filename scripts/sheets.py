@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from collections import Counter
+import gspread
+import streamlit as st
+from dotenv import load_dotenv
+from google.oauth2 import service_account
+from gspread.http_client import HTTPClient
+from scripts import metrics
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# 🔐 Cliente Google Sheets compartilhado pelo processo: credenciais, planilha e abas ficam em cache.
+# O token é renovado sob demanda pela sessão autorizada do google-auth (só quando expira).
+_lock = threading.Lock()
+_spreadsheet = None
+_worksheets = {}
+api_calls = Counter()
+# Separate from _lock: requests are also made while _lock is held (open_by_url, worksheets())
+_calls_lock = threading.Lock()
+
+
+class CountingHTTPClient(HTTPClient):
+    def request(self, method, endpoint, *args, **kwargs):
+        with _calls_lock:
+            api_calls[method.upper()] += 1
+        response = super().request(method, endpoint, *args, **kwargs)
+        sent = len(response.request.body or b"") if response.request is not None else 0
+        metrics.count(sheets_calls=1, sheets_bytes=sent + len(response.content))
+        return response
+
+
+def api_call_count():
+    with _calls_lock:
+        return sum(api_calls.values())
+
+
+def load_credentials():
+    # ☁️ STREAMLIT CLOUD – tenta primeiro
+    try:
+        info = dict(st.secrets["gcp_service_account"])
+        return service_account.Credentials.from_service_account_info(info, scopes=SCOPES), st.secrets["SHEET_URL"]
+    except Exception as cloud_error:
+        print("⚠️ Falha ao carregar via st.secrets:", cloud_error)
+
+    # 💻 LOCAL – arquivo JSON ou o próprio JSON na variável (Render)
+    load_dotenv(dotenv_path=os.path.join("config", ".env"))
+    account = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
+    sheet_url = os.getenv("GOOGLE_SHEET_URL")
+    if account and os.path.exists(account):
+        return service_account.Credentials.from_service_account_file(account, scopes=SCOPES), sheet_url
+    if account and account.strip().startswith("{"):
+        return service_account.Credentials.from_service_account_info(json.loads(account), scopes=SCOPES), sheet_url
+    return None, None
+
+
+def get_spreadsheet():
+    global _spreadsheet
+    with _lock:
+        if _spreadsheet is None:
+            creds, sheet_url = load_credentials()
+            if creds is None:
+                raise RuntimeError("credenciais do Google não encontradas")
+            client = gspread.authorize(creds, http_client=CountingHTTPClient)
+            _spreadsheet = client.open_by_url(sheet_url)
+        return _spreadsheet
+
+
+# 📑 Abas por título; uma única leitura de metadados preenche o cache de todas
+def get_worksheet(title):
+    with _lock:
+        ws = _worksheets.get(title)
+    if ws is None:
+        spreadsheet = get_spreadsheet()
+        with _lock:
+            _worksheets.clear()
+            _worksheets.update({ws.title: ws for ws in spreadsheet.worksheets()})
+            ws = _worksheets.get(title)
+        if ws is None:
+            raise gspread.WorksheetNotFound(title)
+    return ws
+
+
+# 📖 get_all_records medido (tempo, linhas, bytes) como etapa "sheets_read".
+# as_text=True mantém as células como texto: sem isso "04252011000110" volta como 4252011000110
+def read_records(ws, as_text=False):
+    with metrics.stage("sheets_read", sheet=ws.title) as step:
+        records = ws.get_all_records(numericise_ignore=["all"] if as_text else [])
+        step.rows = len(records)
+    return records
+
+
+def add_worksheet(title, rows, cols):
+    ws = get_spreadsheet().add_worksheet(title=title, rows=rows, cols=cols)
+    with _lock:
+        _worksheets[title] = ws
+    return ws
+
+
+def delete_worksheet(title):
+    ws = get_worksheet(title)
+    get_spreadsheet().del_worksheet(ws)
+    with _lock:
+        _worksheets.pop(title, None)
@@ -0,0 +1,183 @@
+import os
+import pandas as pd
+from scripts.storage import connect
+from scripts.rfv_core import SEGMENT_CATEGORIES, SEGMENT_DTYPE, generate_rfv_history, month_end_cutoffs
+
+# 🗃️ Arquivo histórico de snapshots: uma linha por (snapshot_day, customerId), segmento como
+# código inteiro (posição em SEGMENT_CATEGORIES). Consultas de um mês são varreduras da chave
+# primária; trajetórias de clientes usam o índice (customerId, snapshot_day).
+NO_HISTORY_CODE = SEGMENT_CATEGORIES.index("Sem histórico")
+# Segmentos considerados "perdidos" para o fluxo de churn
+CHURN_SEGMENTS = ["Hibernando", "Perdidos"]
+CHURN_CODES = [SEGMENT_CATEGORIES.index(s) for s in CHURN_SEGMENTS]
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def archive_months():
+    return int(os.getenv("RFM_ARCHIVE_MONTHS", "12"))
+
+
+def init_archive(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS snapshot_archive (
+            snapshot_day TEXT NOT NULL,
+            customerId TEXT NOT NULL,
+            seller_name TEXT,
+            recency INTEGER,
+            frequency INTEGER,
+            value REAL,
+            segment INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_day, customerId)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_archive_customer ON snapshot_archive (customerId, snapshot_day);
+        CREATE TABLE IF NOT EXISTS archived_days (
+            snapshot_day TEXT PRIMARY KEY,
+            archived_at TEXT NOT NULL,
+            customers INTEGER NOT NULL
+        );
+    """)
+
+
+def day_key(day):
+    return pd.Timestamp(day).strftime(DAY_FORMAT)
+
+
+def open_archive():
+    conn = connect()
+    init_archive(conn)
+    return conn
+
+
+def archived_days(conn=None):
+    conn = conn or open_archive()
+    return [row[0] for row in conn.execute("SELECT snapshot_day FROM archived_days ORDER BY snapshot_day")]
+
+
+# Muda sempre que um mês é (re)arquivado; serve de chave para caches do painel
+def archive_version(conn=None):
+    conn = conn or open_archive()
+    return conn.execute("SELECT COUNT(*), MAX(archived_at) FROM archived_days").fetchone()
+
+
+# 💾 Grava (ou substitui) o snapshot de um mês; aceita customerId ou cnpj como chave
+def archive_snapshot(snapshot_df, conn=None):
+    conn = conn or open_archive()
+    df = snapshot_df.rename(columns={"cnpj": "customerId"})
+    key = day_key(df["snapshot_day"].iloc[0])
+    rows = pd.DataFrame({
+        "customerId": df["customerId"].astype(str),
+        "seller_name": df["seller_name"].astype(object),
+        "recency": df["recency"].astype(object),
+        "frequency": df["frequency"].astype(object),
+        "value": df["value"].astype(float),
+        "segment": df["m0_rfm"].astype(SEGMENT_DTYPE).cat.codes.astype(int),
+    })
+    rows = rows.astype(object).where(rows.notna(), None)
+    with conn:
+        conn.execute("DELETE FROM snapshot_archive WHERE snapshot_day = ?", (key,))
+        conn.executemany(
+            "INSERT INTO snapshot_archive VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((key, *row) for row in rows.itertuples(index=False))
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO archived_days VALUES (?, ?, ?)",
+            (key, pd.Timestamp.now().isoformat(timespec="seconds"), len(rows))
+        )
+    print(f"🗃️ Snapshot de {key} arquivado ({len(rows)} clientes).")
+    return key
+
+
+# 🗓️ Preenche os meses que faltam no arquivo (últimos `months` fechamentos até snapshot_date),
+# todos a partir de uma única passada sobre os pedidos
+def backfill_archive(load_orders, snapshot_date, months=None, conn=None):
+    conn = conn or open_archive()
+    months = months or archive_months()
+    stored = set(archived_days(conn))
+    missing = [c for c in month_end_cutoffs(snapshot_date, months) if day_key(c) not in stored]
+    if not missing:
+        return []
+    print(f"🗓️ Arquivando {len(missing)} meses de histórico RFM...")
+    history = generate_rfv_history(load_orders(), snapshot_date, months=months)
+    return [archive_snapshot(history[cutoff], conn) for cutoff in missing if cutoff in history]
+
+
+def seller_filter(alias, seller=None, exclude_sellers=None, exclude_customers=None):
+    where, params = [], []
+    if seller:
+        where.append(f"{alias}.seller_name = ?")
+        params.append(seller)
+    if exclude_sellers:
+        where.append(f"({alias}.seller_name IS NULL OR {alias}.seller_name NOT IN ({', '.join('?' * len(exclude_sellers))}))")
+        params.extend(exclude_sellers)
+    if exclude_customers:
+        where.append(f"{alias}.customerId NOT IN ({', '.join('?' * len(exclude_customers))})")
+        params.extend(exclude_customers)
+    return "".join(f" AND {w}" for w in where), params
+
+
+# 🔀 Matriz de transição: clientes por (segmento em from_day, segmento em to_day).
+# Filtros de vendedora se aplicam ao mês de destino; quem não existia em from_day é "Sem histórico".
+def transition_matrix(from_day, to_day, seller=None, exclude_sellers=None, exclude_customers=None, conn=None):
+    conn = conn or open_archive()
+    extra, params = seller_filter("c", seller, exclude_sellers, exclude_customers)
+    rows = conn.execute(
+        "SELECT COALESCE(p.segment, ?), c.segment, COUNT(*) "
+        "FROM snapshot_archive c "
+        "LEFT JOIN snapshot_archive p ON p.snapshot_day = ? AND p.customerId = c.customerId "
+        f"WHERE c.snapshot_day = ?{extra} "
+        "GROUP BY 1, 2",
+        (NO_HISTORY_CODE, day_key(from_day), day_key(to_day), *params)
+    ).fetchall()
+    matrix = pd.DataFrame(0, index=SEGMENT_CATEGORIES, columns=SEGMENT_CATEGORIES)
+    for source, target, count in rows:
+        matrix.iat[source, target] = count
+    matrix.index.name = "De"
+    matrix.columns.name = "Para"
+    return matrix
+
+
+# 🧭 Trajetória de segmentos por cliente nos últimos `months` meses arquivados (uma coluna por mês)
+def customer_trajectories(customer_ids=None, months=6, conn=None):
+    conn = conn or open_archive()
+    days = archived_days(conn)[-months:]
+    if not days:
+        return pd.DataFrame()
+    query = (
+        "SELECT customerId, snapshot_day, segment FROM snapshot_archive "
+        f"WHERE snapshot_day IN ({', '.join('?' * len(days))})"
+    )
+    params = list(days)
+    if customer_ids is not None:
+        customer_ids = [str(c) for c in customer_ids]
+        query += f" AND customerId IN ({', '.join('?' * len(customer_ids))})"
+        params.extend(customer_ids)
+    df = pd.read_sql_query(query, conn, params=params)
+    df["segment"] = pd.Categorical.from_codes(df["segment"], dtype=SEGMENT_DTYPE)
+    return df.pivot(index="customerId", columns="snapshot_day", values="segment").reindex(columns=days)
+
+
+# 📉 Fluxo de churn entre meses consecutivos do arquivo: novos, churn (entraram em
+# CHURN_SEGMENTS), reativados (saíram deles) e total ativo fora deles
+def churn_flow(months=12, seller=None, exclude_sellers=None, exclude_customers=None, conn=None):
+    conn = conn or open_archive()
+    days = archived_days(conn)[-(months + 1):]
+    extra, params = seller_filter("c", seller, exclude_sellers, exclude_customers)
+    churn = ", ".join(map(str, CHURN_CODES))
+    flows = []
+    for previous_day, day in zip(days, days[1:]):
+        new, churned, reactivated, active = conn.execute(
+            "SELECT "
+            "SUM(p.customerId IS NULL), "
+            f"SUM(p.segment NOT IN ({churn}) AND c.segment IN ({churn})), "
+            f"SUM(p.segment IN ({churn}) AND c.segment NOT IN ({churn})), "
+            f"SUM(c.segment NOT IN ({churn})) "
+            "FROM snapshot_archive c "
+            "LEFT JOIN snapshot_archive p ON p.snapshot_day = ? AND p.customerId = c.customerId "
+            f"WHERE c.snapshot_day = ?{extra}",
+            (previous_day, day, *params)
+        ).fetchone()
+        flows.append({
+            "snapshot_day": day, "novos": new or 0, "churn": churned or 0,
+            "reativados": reactivated or 0, "ativos": active or 0,
+        })
+    return pd.DataFrame(flows, columns=["snapshot_day", "novos", "churn", "reativados", "ativos"])
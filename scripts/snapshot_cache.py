@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import uuid
+import gspread
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scripts.rfv_core import typed_snapshot
+from scripts.sheets import get_worksheet, read_records
+from scripts.storage import data_dir
+
+# ⚡ Cópia local (Parquet) de cada aba rfm_snapshot_*, para o painel abrir sem baixar a planilha.
+# A versão fica nos metadados do arquivo e numa nota da célula A1 da aba; quem grava na aba
+# (geração do snapshot, marcações do painel) gera uma versão nova e atualiza os dois lados.
+VERSION_KEY = b"rfm_snapshot_version"
+VERSION_PREFIX = "rfm-version:"
+
+
+def cache_path(title):
+    return os.path.join(data_dir(), "snapshots", f"{title}.parquet")
+
+
+def new_version():
+    return f"{pd.Timestamp.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def read_cached_snapshot(title):
+    path = cache_path(title)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        table = pq.read_table(path)
+    except (OSError, pa.ArrowException) as e:
+        print(f"⚠️ Cache local de {title} ilegível, ignorando: {e}")
+        return None, None
+    version = (table.schema.metadata or {}).get(VERSION_KEY, b"").decode() or None
+    return table.to_pandas(), version
+
+
+def write_cached_snapshot(title, df, version):
+    path = cache_path(title)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: version.encode()})
+    # Write to a unique temp file then rename, so a reader never sees a half-written file
+    # and two writers in the same process don't share one
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sheet_version(ws):
+    note = ws.get_note("A1") or ""
+    return note[len(VERSION_PREFIX):].strip() if note.startswith(VERSION_PREFIX) else None
+
+
+def stamp_sheet_version(ws, version):
+    ws.update_note("A1", f"{VERSION_PREFIX} {version}")
+
+
+# 💾 Depois de gravar na aba: nova versão na aba e no arquivo local
+def save_snapshot_version(title, df, ws=None):
+    version = new_version()
+    try:
+        stamp_sheet_version(ws or get_worksheet(title), version)
+        write_cached_snapshot(title, df, version)
+    except Exception as e:
+        print(f"⚠️ Não foi possível atualizar o cache local de {title}: {e}")
+    return version
+
+
+# 📂 Snapshot tipado: arquivo local se a versão bate com a da aba; senão lê a aba e refaz o cache.
+# Sem acesso ao Sheets, usa o arquivo local mesmo sem conferir a versão.
+def load_snapshot(title):
+    started = time.perf_counter()
+    cached, local_version = read_cached_snapshot(title)
+    try:
+        ws = get_worksheet(title)
+        remote_version = sheet_version(ws)
+    except gspread.WorksheetNotFound:
+        raise
+    except Exception as e:
+        if cached is None:
+            raise
+        print(f"⚠️ Sheets indisponível ({e}); usando cache local de {title} (versão {local_version}).")
+        return typed_snapshot(cached)
+
+    if cached is not None and remote_version and local_version == remote_version:
+        print(f"⚡ {title} carregado do cache local em {time.perf_counter() - started:.2f}s")
+        return typed_snapshot(cached)
+
+    df = typed_snapshot(pd.DataFrame(read_records(ws)))
+    version = remote_version
+    try:
+        if not version:
+            version = new_version()
+            stamp_sheet_version(ws, version)
+        write_cached_snapshot(title, df, version)
+    except Exception as e:
+        print(f"⚠️ Não foi possível atualizar o cache local de {title}: {e}")
+    print(f"📥 {title} carregado do Google Sheets em {time.perf_counter() - started:.2f}s")
+    return df
@@ -0,0 +1,221 @@
+import pandas as pd
+from datetime import timedelta
+from scripts.storage import connect
+from scripts.order_store import get_order_store
+from scripts.rfv_core import AGGREGATE_COLUMNS, customer_aggregates, build_snapshot
+
+STATE_COLUMNS = AGGREGATE_COLUMNS[1:]
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# 🗄️ Estado persistido por cliente: agregados já calculados até cada data de corte.
+# Cortes são guardados por dia; os pedidos da planilha só têm data (sem hora).
+def init_state(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS state_cutoffs (
+            cutoff TEXT PRIMARY KEY,
+            computed_at TEXT NOT NULL,
+            customers INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS customer_state (
+            cutoff TEXT NOT NULL,
+            customerId NOT NULL,
+            seller_name,
+            frequency INTEGER NOT NULL,
+            value REAL NOT NULL,
+            first_purchase_date TEXT NOT NULL,
+            last_purchase_date TEXT NOT NULL,
+            PRIMARY KEY (cutoff, customerId)
+        );
+        CREATE TABLE IF NOT EXISTS state_orders (
+            orderId PRIMARY KEY,
+            cutoff TEXT NOT NULL
+        );
+    """)
+    # store_rowid: maior rowid da tabela orders quando o estado foi calculado. INSERT OR REPLACE
+    # dá rowid novo a pedidos alterados, então rowid > store_rowid = chegou ou mudou depois.
+    if "store_rowid" not in {row[1] for row in conn.execute("PRAGMA table_info(state_cutoffs)")}:
+        conn.execute("ALTER TABLE state_cutoffs ADD COLUMN store_rowid INTEGER")
+
+
+def cutoff_key(cutoff):
+    return pd.Timestamp(cutoff).strftime('%Y-%m-%d')
+
+
+def stored_cutoffs(conn):
+    return [row[0] for row in conn.execute("SELECT cutoff FROM state_cutoffs ORDER BY cutoff")]
+
+
+def load_state(conn, key):
+    state = pd.read_sql_query(
+        "SELECT customerId, seller_name, frequency, value, first_purchase_date, last_purchase_date "
+        "FROM customer_state WHERE cutoff = ? ORDER BY customerId",
+        conn, params=(key,)
+    )
+    for col in ['first_purchase_date', 'last_purchase_date']:
+        state[col] = pd.to_datetime(state[col])
+    return state[STATE_COLUMNS]
+
+
+def store_watermark(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders'").fetchone():
+        return None
+    return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM orders").fetchone()[0]
+
+
+# 🧹 Apaga os estados com corte >= since (e os pedidos marcados neles); serão recalculados
+def drop_states(conn, since):
+    key = cutoff_key(since)
+    conn.execute("DELETE FROM customer_state WHERE cutoff >= ?", (key,))
+    conn.execute("DELETE FROM state_orders WHERE cutoff >= ?", (key,))
+    dropped = conn.execute("DELETE FROM state_cutoffs WHERE cutoff >= ?", (key,)).rowcount
+    if dropped:
+        print(f"🧹 {dropped} estados RFM a partir de {key} descartados (pedidos novos ou alterados nesse período)")
+    return dropped
+
+
+def invalidate_states(since):
+    conn = connect()
+    try:
+        with conn:
+            init_state(conn)
+            return drop_states(conn, since)
+    finally:
+        conn.close()
+
+
+# Estados que não enxergam pedidos gravados depois deles com data <= corte (backfill atrasado,
+# dia que falhou, carga da planilha) ou salvos antes do watermark existir: descarta a partir
+# da data mais antiga afetada
+def drop_stale_states(conn):
+    if store_watermark(conn) is None:
+        return 0
+    earliest = None
+    for key, watermark in conn.execute("SELECT cutoff, store_rowid FROM state_cutoffs ORDER BY cutoff").fetchall():
+        if watermark is None:
+            first = key
+        else:
+            first = conn.execute(
+                "SELECT MIN(createdAt) FROM orders WHERE rowid > ? AND createdAt <= ?", (watermark, key)
+            ).fetchone()[0]
+        if first is not None:
+            earliest = first if earliest is None else min(earliest, first)
+    return drop_states(conn, earliest) if earliest is not None else 0
+
+
+def save_state(conn, key, state, order_ids, watermark=None):
+    conn.execute("DELETE FROM customer_state WHERE cutoff = ?", (key,))
+    rows = state.assign(
+        first_purchase_date=state['first_purchase_date'].dt.strftime(DATE_FORMAT),
+        last_purchase_date=state['last_purchase_date'].dt.strftime(DATE_FORMAT),
+    )[STATE_COLUMNS].astype(object).where(state[STATE_COLUMNS].notna(), None)
+    conn.executemany(
+        "INSERT INTO customer_state VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((key, *row) for row in rows.itertuples(index=False))
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO state_orders VALUES (?, ?)",
+        ((order_id, key) for order_id in order_ids)
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO state_cutoffs (cutoff, computed_at, customers, store_rowid) VALUES (?, ?, ?, ?)",
+        (key, pd.Timestamp.now().strftime(DATE_FORMAT), len(state), watermark)
+    )
+
+
+def seen_order_ids(conn, order_ids, up_to_key):
+    # orderIds already folded into a state at or before up_to_key (temp table join, O(delta))
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_orders (orderId PRIMARY KEY)")
+    conn.execute("DELETE FROM incoming_orders")
+    conn.executemany("INSERT OR IGNORE INTO incoming_orders VALUES (?)", ((o,) for o in order_ids))
+    rows = conn.execute(
+        "SELECT s.orderId FROM state_orders s JOIN incoming_orders i ON i.orderId = s.orderId "
+        "WHERE s.cutoff <= ?", (up_to_key,)
+    )
+    return {row[0] for row in rows}
+
+
+def combine_state(base, delta):
+    if base.empty:
+        return delta
+    if delta.empty:
+        return base
+    merged = base.merge(delta, on='customerId', how='outer', suffixes=('_base', ''), sort=True)
+    return pd.DataFrame({
+        'customerId': merged['customerId'],
+        'seller_name': merged['seller_name'].where(merged['seller_name'].notna(), merged['seller_name_base']),
+        'frequency': (merged['frequency'].fillna(0) + merged['frequency_base'].fillna(0)).astype('int64'),
+        'value': merged['value'].fillna(0.0) + merged['value_base'].fillna(0.0),
+        'first_purchase_date': merged[['first_purchase_date_base', 'first_purchase_date']].min(axis=1),
+        'last_purchase_date': merged[['last_purchase_date_base', 'last_purchase_date']].max(axis=1),
+    }, columns=STATE_COLUMNS)
+
+
+# 🔁 Agregados para os cortes pedidos, reaproveitando o estado salvo e somando só os pedidos novos.
+# load_orders(since) deve devolver os pedidos com createdAt posterior a `since` (None = histórico todo).
+def incremental_aggregates(load_orders, cutoffs):
+    cutoffs = sorted(cutoffs)
+    conn = connect()
+    try:
+        with conn:
+            init_state(conn)
+            drop_stale_states(conn)
+            stored = stored_cutoffs(conn)
+            pending = [c for c in cutoffs if cutoff_key(c) not in stored]
+
+            states = {}
+            if pending:
+                first_key = cutoff_key(pending[0])
+                base_key = max((k for k in stored if k < first_key), default=None)
+                base = load_state(conn, base_key) if base_key else pd.DataFrame(columns=STATE_COLUMNS)
+                since = pd.Timestamp(base_key) if base_key else None
+
+                # Taken before reading, so anything written meanwhile counts as "after"
+                watermark = store_watermark(conn)
+                orders = load_orders(since)
+                created = pd.to_datetime(orders['createdAt'], errors='coerce')
+                if since is not None:
+                    orders = orders[created.dt.normalize() > since]
+                if 'orderId' in orders.columns:
+                    orders = orders.drop_duplicates(subset='orderId', keep='last')
+                    if base_key:
+                        seen = seen_order_ids(conn, orders['orderId'].tolist(), base_key)
+                        orders = orders[~orders['orderId'].isin(seen)]
+                print(f"🧮 Atualizando estado RFM a partir de {base_key or 'início'} com {len(orders)} pedidos novos")
+
+                delta = customer_aggregates(orders, pending)
+                delta['customerId'] = delta['customerId'].astype(object)
+                order_dates = pd.to_datetime(orders['createdAt'], errors='coerce').dt.normalize()
+                previous_key = base_key
+                for cutoff in pending:
+                    key = cutoff_key(cutoff)
+                    state = combine_state(base, delta[delta['cutoff'] == cutoff].drop(columns='cutoff'))
+                    state = state.reset_index(drop=True)
+                    new_ids = []
+                    if 'orderId' in orders.columns:
+                        in_range = order_dates <= pd.Timestamp(key)
+                        if previous_key:
+                            in_range &= order_dates > pd.Timestamp(previous_key)
+                        new_ids = orders.loc[in_range, 'orderId']
+                    save_state(conn, key, state, new_ids, watermark)
+                    states[key] = state
+                    previous_key = key
+
+            frames = []
+            for cutoff in cutoffs:
+                key = cutoff_key(cutoff)
+                state = states[key] if key in states else load_state(conn, key)
+                frames.append(state.assign(cutoff=cutoff)[AGGREGATE_COLUMNS])
+    finally:
+        conn.close()
+
+    aggregates = pd.concat(frames, ignore_index=True)
+    aggregates['customerId'] = pd.Categorical(aggregates['customerId'])
+    return aggregates
+
+
+def generate_rfv_snapshot_incremental(snapshot_date, load_orders=None):
+    load_orders = load_orders or get_order_store().read
+    prev_snapshot_date = snapshot_date.replace(day=1) - timedelta(days=1)
+    aggregates = incremental_aggregates(load_orders, [prev_snapshot_date, snapshot_date])
+    return build_snapshot(aggregates, snapshot_date, prev_snapshot_date)
@@ -0,0 +1,21 @@
+import os
+import sqlite3
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv("config/.env")
+
+DB_FILE = "rfm.sqlite"
+
+
+# 💾 Pasta local de dados (SQLite/Parquet); configurável via RFM_DATA_DIR
+def data_dir():
+    path = Path(os.getenv("RFM_DATA_DIR", "data"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def connect(filename=DB_FILE, **kwargs):
+    conn = sqlite3.connect(data_dir() / filename, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
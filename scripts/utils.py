@@ -1,46 +1,18 @@
 # Utility functions
 import re
-import json
-import gspread
+import numpy as np
 import pandas as pd 
 import streamlit as st
-from io import BytesIO
-from google.oauth2 import service_account
-from dotenv import load_dotenv
-import os
+from scripts.sheets import get_spreadsheet, get_worksheet, read_records
 
-# ✅ Carrega variáveis locais do .env (sem efeito no Streamlit Cloud)
-
-# 🔐 Autenticação com Google Sheets (funciona no Cloud e local)
+# 🔐 Planilha do Google Sheets (cliente em cache no processo, ver scripts/sheets.py)
 def get_google_sheet():
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-
-    # ☁️ STREAMLIT CLOUD – tenta primeiro
     try:
-        creds = service_account.Credentials.from_service_account_info(
-            dict(st.secrets["gcp_service_account"]),
-            scopes=scopes
-        )
-        sheet_url = st.secrets["SHEET_URL"]
-        client = gspread.authorize(creds)
-        return client.open_by_url(sheet_url)
-    except Exception as cloud_error:
-        print("⚠️ Falha ao carregar via st.secrets:", cloud_error)
-
-    # 💻 LOCAL – tenta se o JSON realmente existir
-    load_dotenv(dotenv_path=os.path.join("config", ".env"))
-    json_path = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
-    if json_path and os.path.exists(json_path):
-        sheet_url = os.getenv("GOOGLE_SHEET_URL")
-        creds = service_account.Credentials.from_service_account_file(
-            json_path, scopes=scopes
-        )
-        client = gspread.authorize(creds)
-        return client.open_by_url(sheet_url)
-
-    # 🚨 Falhou em tudo
-    st.error("❌ Nenhuma credencial válida encontrada.")
-    st.stop()
+        return get_spreadsheet()
+    except RuntimeError:
+        # 🚨 Falhou em tudo
+        st.error("❌ Nenhuma credencial válida encontrada.")
+        st.stop()
 
 # 📞 Formatação de telefone
 def clean_phone_number(phone):
@@ -55,6 +27,33 @@ def clean_phone_number(phone):
         return f"+55{phone[:2]}9{phone[2:]}"
     return None
 
+# 📞 Mesma regra de clean_phone_number sobre colunas inteiras (None onde o número não serve)
+PHONE_COLUMNS = ["whatsapp", "telefone", "mobile"]
+
+
+def clean_phone_numbers(values):
+    values = pd.Series(values, dtype=object)
+    # object dtype keeps Python's regex engine, so \D matches exactly what re.sub matches
+    digits = values.where(values.notna(), "").map(str).astype(object).str.replace(r"\D", "", regex=True)
+    length = digits.str.len().to_numpy()
+    cleaned = np.where(
+        (length == 11) & (digits.str[2] == "9").to_numpy(),
+        "+55" + digits,
+        np.where((length == 10) | (length == 11), "+55" + digits.str[:2] + "9" + digits.str[2:], None)
+    )
+    return pd.Series(cleaned, index=values.index, dtype=object)
+
+
+# 💬 Contato por cliente: primeiro número válido entre whatsapp, telefone e mobile (nessa
+# ordem), em E.164, e o link wa.me correspondente
+def contact_columns(df, columns=PHONE_COLUMNS):
+    phone = pd.Series([None] * len(df), index=df.index, dtype=object)
+    for col in columns:
+        if col in df.columns:
+            phone = phone.where(phone.notna(), clean_phone_numbers(df[col]))
+    link = ("https://wa.me/" + phone.str[1:]).where(phone.notna(), None)
+    return pd.DataFrame({"whatsapp": phone, "whatsapp_link": link}, index=df.index)
+
 # 💬 Mensagens sugeridas por segmento RFV
 def suggested_message(segment):
     messages = {
@@ -72,18 +71,10 @@ def suggested_message(segment):
     }
     return messages.get(segment, '')
 
-# 📥 Exporta DataFrame como Excel
-def to_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='RFV')
-    return output.getvalue()
-
 # 📊 Carrega nomes das vendedoras do Google Sheet
 def get_seller_names():
-    sheet = get_google_sheet()
     try:
-        sellers_df = pd.DataFrame(sheet.worksheet("Vendedoras").get_all_records())
+        sellers_df = pd.DataFrame(read_records(get_worksheet("Vendedoras")))
         sellers_df.columns = sellers_df.columns.str.lower()
         active = sorted(sellers_df[sellers_df["status"].str.lower() == "ativo"]["seller_name"].dropna().unique())
         inactive = sorted(sellers_df[sellers_df["status"].str.lower() != "ativo"]["seller_name"].dropna().unique())
@@ -92,6 +83,31 @@ def get_seller_names():
         print(f"⚠️ Erro ao carregar 'Vendedoras': {e}")
         return [], []
 
+# 💰 Valor em reais sem centavos ("R$ 1.250" em vez de "1,250.00")
+def format_brl(value):
+    return f"R$ {int(round(value)):,}".replace(",", ".")
+
+# 💰 Mesmo formato para uma coluna inteira: grupos de milhar por aritmética inteira e
+# tabelas com o texto de 0..999 (NaN vira "")
+THOUSANDS = np.array([str(i) for i in range(1000)], dtype=object)
+DOT_THOUSANDS = np.array([f".{i:03d}" for i in range(1000)], dtype=object)
+
+def format_brl_values(values):
+    index = values.index if isinstance(values, pd.Series) else None
+    rounded = np.round(np.asarray(values, dtype=float))
+    valid = ~np.isnan(rounded)
+    ints = np.where(valid, rounded, 0).astype(np.int64)
+
+    rest = np.abs(ints)
+    tail = np.full(len(rest), "", dtype=object)
+    while (rest >= 1000).any():
+        more = rest >= 1000
+        tail[more] = DOT_THOUSANDS[rest[more] % 1000] + tail[more]
+        rest[more] //= 1000
+
+    text = np.where(ints < 0, "R$ -", "R$ ").astype(object) + THOUSANDS[rest] + tail
+    return pd.Series(np.where(valid, text, ""), index=index, dtype=object)
+
 # 📆 Data relativa (dias, meses, anos)
 def relative_date(date):
     today = pd.Timestamp.today()
@@ -120,3 +136,28 @@ def relative_date(date):
         if months == 0:
             return f"{years} {year_unit}"
         return f"{years} {year_unit} {months} {month_unit}"
+
+# 📆 Mesmo texto de relative_date para uma coluna inteira, com uma única data de referência
+def relative_dates(dates, today=None):
+    dates = pd.to_datetime(pd.Series(dates), errors="coerce")
+    today = today if today is not None else pd.Timestamp.today()
+    days = (today - dates) // pd.Timedelta(days=1)
+    valid = days.notna().to_numpy()
+    d = days.fillna(0).to_numpy(dtype=np.int64)
+
+    def text(values):
+        return values.astype(str).astype(object)
+
+    # até 31 dias
+    short = text(d) + np.where(d == 1, " dia", " dias")
+    # até 1 ano, em meses (round do Python e np.round arredondam .5 para o par)
+    months = np.round(d / 30).astype(np.int64)
+    medium = text(months) + np.where(months == 1, " mês", " meses")
+    # anos e meses restantes
+    years, remaining = d // 365, d % 365
+    rest_months = np.round(remaining / 30).astype(np.int64)
+    long = text(years) + np.where(years == 1, " ano", " a")
+    long = np.where(rest_months == 0, long, long + " " + text(rest_months) + np.where(rest_months == 1, " mês", " m"))
+
+    result = np.where(d <= 31, short, np.where(d <= 365, medium, long))
+    return pd.Series(np.where(valid, result, ""), index=dates.index, dtype=object)
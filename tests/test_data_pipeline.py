@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+from gspread.utils import numericise
+import scripts.data_pipeline as dp
+from scripts.order_store import normalize_orders
+
+CNPJ = "04252011000110"
+
+
+# 🧪 Worksheet stand-in: values stored as text, numericised on read like gspread's get_all_records
+class FakeWorksheet:
+    def __init__(self, title, rows):
+        self.title = title
+        self.rows = [[str(v) for v in row] for row in rows]
+
+    def get_all_records(self, numericise_ignore=()):
+        header, *body = self.rows
+        if "all" not in numericise_ignore:
+            body = [[numericise(v) for v in row] for row in body]
+        return [dict(zip(header, row)) for row in body]
+
+
+@pytest.fixture
+def sheets(monkeypatch, tmp_path):
+    monkeypatch.setenv("RFM_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("RFM_METRICS_LOG", "off")
+    tabs = {
+        "Pedidos": FakeWorksheet("Pedidos", [
+            ["orderId", "customerId", "createdAt", "seller", "netValue", "status", "loja"],
+            ["1001", CNPJ, "2025-05-02", "Ana", "150.5", "FATURADO", "LOJA"],
+        ]),
+        "Clientes": FakeWorksheet("Clientes", [
+            ["document", "name", "seller", "whatsapp", "telefone", "mobile"],
+            [CNPJ, "Cliente Zero", "Ana", "", "(11) 98765-4321", ""],
+        ]),
+    }
+    monkeypatch.setattr(dp, "get_worksheet", lambda title: tabs[title])
+    return tabs
+
+
+def test_seeded_store_keeps_leading_zero_cnpj(sheets):
+    store = dp.get_seeded_order_store()
+    assert store.read()["customerId"].tolist() == [CNPJ]
+
+
+def test_leading_zero_client_is_not_fetched_again(sheets, monkeypatch):
+    ctx = dp.PipelineContext()
+    # A new order for the same customer as the API sends it (CNPJ as text)
+    ctx.store.upsert(normalize_orders([{
+        "orderId": "1002", "customerId": CNPJ, "createdAt": "2025-06-01", "seller": "Ana",
+        "netValue": 99.0, "status": "FATURADO", "loja": "LOJA",
+    }]))
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("client looked up again")
+    monkeypatch.setattr(dp, "iter_client_batches", unexpected)
+
+    dp.backfill_missing_clients(ctx)
+    assert set(ctx.orders()["customerId"]) == {CNPJ}
+    assert ctx.frame("Clientes")["document"].tolist() == [CNPJ]
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, str):
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return self.body
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def fetch_customers(self, customer_ids):
+        for customer_id in customer_ids:
+            yield customer_id, self.responses[customer_id]
+
+
+def test_client_with_invalid_json_is_a_failure_not_an_abort(sheets):
+    client = FakeClient({
+        "111": FakeResponse(200, "<html>erro</html>"),
+        "222": FakeResponse(200, {"document": "222", "name": "Dois"}),
+        "333": FakeResponse(503, None),
+    })
+    batches = list(dp.iter_client_batches(["111", "222", "333"], client=client, ctx=dp.PipelineContext()))
+    assert [b["document"].tolist() for b in batches] == [["222"]]
@@ -0,0 +1,30 @@
+import os
+import threading
+import pandas as pd
+import pytest
+from scripts.exports import export_file, version_dir
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_parallel_exports_of_the_same_file_do_not_clash(monkeypatch, tmp_path, fmt):
+    monkeypatch.setenv("RFM_DATA_DIR", str(tmp_path))
+    df = pd.DataFrame({"cnpj": [f"{i:014d}" for i in range(50_000)], "value": range(50_000)})
+    errors = []
+
+    def export():
+        try:
+            export_file(df, "snap-1", "rfv", fmt)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert os.listdir(version_dir("snap-1")) == [f"rfv.{fmt}"]
+    path = os.path.join(version_dir("snap-1"), f"rfv.{fmt}")
+    back = pd.read_csv(path, dtype={"cnpj": str}) if fmt == "csv" else pd.read_parquet(path)
+    assert len(back) == len(df) and back["cnpj"].iloc[1] == "00000000000001"
@@ -0,0 +1,17 @@
+import os
+from scripts import metrics
+
+
+def test_log_is_rotated_past_the_size_limit(monkeypatch, tmp_path):
+    path = tmp_path / "logs" / "metrics.jsonl"
+    monkeypatch.setenv("RFM_METRICS_LOG", str(path))
+    monkeypatch.setenv("RFM_METRICS_MAX_MB", "0.01")  # 10 kB
+
+    for i in range(1000):
+        with metrics.stage("dashboard_rerun", i=i):
+            pass
+
+    assert os.path.getsize(path) < 10_000 + 1_000
+    assert os.path.getsize(f"{path}.1") < 10_000 + 1_000
+    assert sorted(os.listdir(path.parent)) == ["metrics.jsonl", "metrics.jsonl.1"]
+    assert metrics.read_recent(limit=5)["i"].tolist() == [995, 996, 997, 998, 999]
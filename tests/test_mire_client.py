@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from scripts.mire_client import MireClient
+
+
+# 🧪 Stub of the Mire API: /orders?data=YYYY-MM-DD answers with the date it was asked for, after
+# the statuses queued for that date (e.g. 429, 503) run out. Each request takes DELAY seconds
+# (or its entry in `delays`), so several are in flight at once.
+DELAY = 0.02
+
+
+class StubApi:
+    def __init__(self):
+        self.failures = {}
+        self.delays = {}
+        self.requests = []
+        self.completed = []
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                day = parse_qs(url.query).get("data", [url.path.rsplit("/", 1)[-1]])[0]
+                with api.lock:
+                    api.requests.append(day)
+                    api.in_flight += 1
+                    api.peak = max(api.peak, api.in_flight)
+                    queued = api.failures.get(day)
+                    failure = queued.pop(0) if queued else None
+                time.sleep(api.delays.get(day, DELAY))
+                with api.lock:
+                    api.in_flight -= 1
+                    api.completed.append(day)
+                if failure:
+                    status, headers = failure
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = json.dumps({"data": day}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.setenv("MIRE_CACHE_ENABLED", "0")
+    monkeypatch.setenv("API_USERNAME", "user")
+    monkeypatch.setenv("API_PASSWORD", "secret")
+    monkeypatch.setenv("RFM_DATA_DIR", str(tmp_path))
+    stub = StubApi()
+    yield stub
+    stub.close()
+
+
+# Client whose retry waits are recorded instead of slept
+def make_client(api, monkeypatch, **kwargs):
+    client = MireClient(base_url=api.url, **kwargs)
+    delays = []
+    compute = client.retry_delay
+
+    def record(attempt, response=None):
+        delays.append(compute(attempt, response))
+        return 0
+    monkeypatch.setattr(client, "retry_delay", record)
+    return client, delays
+
+
+def test_retries_429_and_503_honouring_retry_after(api, monkeypatch):
+    api.failures["2025-01-02"] = [(429, {"Retry-After": "7"}), (503, {})]
+    client, delays = make_client(api, monkeypatch, max_workers=2, backoff=0.5)
+
+    results = list(client.fetch_orders(datetime(2025, 1, 1), datetime(2025, 1, 3)))
+
+    assert [r.status_code for _, r in results] == [200, 200, 200]
+    assert api.requests.count("2025-01-02") == 3
+    assert delays[0] == 7.0
+    # No Retry-After on the 503: exponential backoff with jitter (attempt 1 -> 1.0 to 1.5 s)
+    assert 1.0 <= delays[1] <= 1.5
+
+
+def test_gives_up_after_max_retries(api, monkeypatch):
+    api.failures["2025-01-01"] = [(503, {})] * 5
+    client, delays = make_client(api, monkeypatch, max_workers=1, max_retries=2)
+
+    [(_, response)] = client.fetch_orders(datetime(2025, 1, 1), datetime(2025, 1, 1))
+
+    assert response.status_code == 503
+    assert api.requests.count("2025-01-01") == 3
+    assert len(delays) == 2
+
+
+def test_results_come_back_in_date_order(api, monkeypatch):
+    client, _ = make_client(api, monkeypatch, max_workers=4)
+    # The first day is answered last among the ones in flight with it
+    api.delays["2025-01-01"] = 0.3
+
+    results = list(client.fetch_orders(datetime(2025, 1, 1), datetime(2025, 1, 31)))
+
+    days = [day.strftime("%Y-%m-%d") for day, _ in results]
+    assert days == [f"2025-01-{d:02d}" for d in range(1, 32)]
+    assert [r.json()["data"] for _, r in results] == days
+    assert api.completed.index("2025-01-01") >= 3  # the server really answered out of order
+
+
+def test_concurrency_is_bounded(api, monkeypatch):
+    client, _ = make_client(api, monkeypatch, max_workers=3)
+
+    list(client.fetch_orders(datetime(2025, 1, 1), datetime(2025, 1, 20)))
+
+    assert 1 < api.peak <= 3
+
+
+def test_pending_window_does_not_run_ahead_of_the_consumer(api, monkeypatch):
+    client, _ = make_client(api, monkeypatch, max_workers=2)
+    pulled = []
+
+    def ids():
+        for i in range(100):
+            pulled.append(i)
+            yield str(i)
+
+    results = client.fetch_customers(ids())
+    first_id, _ = next(results)
+
+    assert first_id == "0"
+    assert len(pulled) <= 2 * client.max_workers
@@ -0,0 +1,62 @@
+import itertools
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.rfv_core import SEGMENT_CATEGORIES, segment, segment_array, segment_codes
+
+BOUNDARIES = [30, 60, 120, 180, 360]
+RECENCIES = sorted({0, *(b + d for b in BOUNDARIES for d in (-1, -0.5, 0, 0.5, 1)), 1000}) + [math.nan]
+FREQUENCIES = [0, 1, 2, 5, 9, 10, 11, 50, math.nan]
+
+
+# The if/elif chain the vectorized engine replaced, kept verbatim as the reference
+def original_segment(row):
+    r = row['recency']
+    f = row['frequency']
+    if r <= 30 and f >= 10:
+        return 'Campeões'
+    elif 30 < r <= 120 and f >= 10:
+        return 'Leais'
+    elif r <= 60 and 2 <= f <= 9:
+        return 'Potenciais Leais'
+    elif r <= 30 and f == 1:
+        return 'Recentes'
+    elif 30 < r <= 60 and f == 1:
+        return 'Promissores'
+    elif 60 < r <= 120 and 2 <= f <= 9:
+        return 'Precisam Atenção'
+    elif 120 < r <= 360 and f >= 10:
+        return 'Não pode perdê-los'
+    elif 120 < r <= 180 and 2 <= f <= 9:
+        return 'Em risco'
+    elif 60 < r <= 180 and f == 1:
+        return 'Prestes a dormir'
+    elif 180 < r <= 360 and 1 <= f <= 9:
+        return 'Hibernando'
+    elif r > 360:
+        return 'Perdidos'
+    else:
+        return 'Outros'
+
+
+GRID = list(itertools.product(RECENCIES, FREQUENCIES))
+
+
+@pytest.mark.parametrize("recency, frequency", GRID)
+def test_segment_matches_original_chain(recency, frequency):
+    row = {"recency": recency, "frequency": frequency}
+    assert segment(row) == original_segment(row)
+
+
+def test_segment_codes_match_original_chain():
+    recency, frequency = map(np.array, zip(*GRID))
+    expected = [original_segment({"recency": r, "frequency": f}) for r, f in GRID]
+    got = [SEGMENT_CATEGORIES[c] for c in segment_codes(recency, frequency)]
+    assert got == expected
+
+
+def test_segment_array_accepts_series_with_missing_recency():
+    recency = pd.Series([10, None, 400], dtype="Int64")
+    frequency = pd.Series([12, 3, 1])
+    assert list(segment_array(recency.astype(float), frequency)) == ["Campeões", "Outros", "Perdidos"]
@@ -0,0 +1,71 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+import gspread
+import pytest
+from gspread.http_client import HTTPClient
+from scripts import sheets
+
+
+class FakeSpreadsheet:
+    def __init__(self, titles):
+        self.titles = titles
+
+    def worksheets(self):
+        time.sleep(0.001)  # a real metadata request; the cache is empty meanwhile
+        return [SimpleNamespace(title=t) for t in self.titles]
+
+
+@pytest.fixture
+def spreadsheet(monkeypatch):
+    fake = FakeSpreadsheet(["Pedidos", "Clientes"])
+    monkeypatch.setattr(sheets, "_spreadsheet", fake)
+    monkeypatch.setattr(sheets, "_worksheets", {})
+    return fake
+
+
+def run_threads(fn, n=8):
+    # Switch threads very often, so unlocked read-modify-write sequences get interleaved
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    errors = []
+
+    def worker():
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sys.setswitchinterval(interval)
+    return errors
+
+
+def test_get_worksheet_survives_concurrent_refreshes(spreadsheet):
+    # Asking for a missing tab clears and refills the cache while others read from it
+    def worker():
+        for _ in range(50):
+            assert sheets.get_worksheet("Pedidos").title == "Pedidos"
+            with pytest.raises(gspread.WorksheetNotFound):
+                sheets.get_worksheet("Nope")
+
+    assert run_threads(worker) == []
+
+
+def test_api_calls_are_counted_from_every_thread(monkeypatch):
+    monkeypatch.setattr(sheets, "api_calls", sheets.Counter())
+    monkeypatch.setattr(HTTPClient, "request",
+                        lambda self, method, endpoint, *a, **k: SimpleNamespace(request=None, content=b""))
+    client = sheets.CountingHTTPClient.__new__(sheets.CountingHTTPClient)
+
+    def worker():
+        for _ in range(2000):
+            client.request("get", "values")
+
+    assert run_threads(worker) == []
+    assert sheets.api_call_count() == 8 * 2000
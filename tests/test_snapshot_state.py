@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate_orders
+from scripts.order_store import get_order_store
+from scripts.rfv_core import generate_rfv_history
+from scripts.snapshot_state import generate_rfv_snapshot_incremental, invalidate_states, stored_cutoffs
+from scripts.storage import connect
+
+MONTH_ENDS = [pd.Timestamp("2025-03-31"), pd.Timestamp("2025-04-30"), pd.Timestamp("2025-05-31")]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv("RFM_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("RFM_METRICS_LOG", "off")
+    return get_order_store()
+
+
+@pytest.fixture
+def orders():
+    return generate_orders(4000, seed=3, start="2024-06-01", end="2025-05-31")
+
+
+def comparable(snapshot):
+    df = snapshot.sort_values("customerId").reset_index(drop=True)
+    return df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+# Incremental snapshot (saved states reused where still valid) against a full recompute
+def assert_matches_full(store, snapshot_date):
+    incremental = generate_rfv_snapshot_incremental(snapshot_date, store.read)
+    full = generate_rfv_history(store.read(), snapshot_date, months=1)[snapshot_date]
+    pd.testing.assert_frame_equal(comparable(incremental), comparable(full), check_dtype=False)
+
+
+def build_states(store):
+    for cutoff in MONTH_ENDS:
+        assert_matches_full(store, cutoff)
+    with connect() as conn:
+        assert len(stored_cutoffs(conn)) >= len(MONTH_ENDS)
+
+
+def test_saved_states_match_full_recompute(store, orders):
+    store.upsert(orders)
+    build_states(store)
+    # Second run reads the saved states
+    assert_matches_full(store, MONTH_ENDS[-1])
+
+
+def test_late_orders_invalidate_saved_states(store, orders):
+    late = orders["createdAt"].between("2025-03-01", "2025-03-31") & (orders.index % 3 == 0)
+    assert late.any()
+    store.upsert(orders[~late])
+    build_states(store)
+
+    store.upsert(orders[late])
+    assert_matches_full(store, MONTH_ENDS[-1])
+    assert_matches_full(store, MONTH_ENDS[0])
+
+
+def test_changed_values_invalidate_saved_states(store, orders):
+    store.upsert(orders)
+    build_states(store)
+
+    changed = store.read()
+    changed = changed[changed["createdAt"] < "2025-03-15"].tail(20).copy()
+    changed["netValue"] += 1000
+    stats = store.upsert(changed)
+    assert stats["changed"] == len(changed)
+    assert_matches_full(store, MONTH_ENDS[-1])
+
+
+@pytest.mark.parametrize("old, new", [("2025-05-20", "2025-02-10"), ("2025-02-10", "2025-05-20")])
+def test_moved_orders_invalidate_from_the_earliest_date(store, orders, old, new):
+    orders = orders.copy()
+    moved = orders.index[:5]
+    orders.loc[moved, "createdAt"] = pd.Timestamp(old)
+    store.upsert(orders)
+    build_states(store)
+
+    moved_rows = store.read().set_index("orderId").loc[orders.loc[moved, "orderId"]].reset_index()
+    moved_rows["createdAt"] = pd.Timestamp(new)
+    stats = store.upsert(moved_rows)
+    # Both the old and the new date are affected; the pipeline drops states from the earliest
+    assert stats["earliest"] == min(old, new)
+    invalidate_states(stats["earliest"])
+    for cutoff in MONTH_ENDS:
+        assert_matches_full(store, cutoff)
+
+
+
+def test_upsert_reports_earliest_touched_date(store, orders):
+    assert store.upsert(orders.iloc[:0])["earliest"] is None
+    store.upsert(orders)
+    assert store.upsert(orders)["earliest"] is None  # nothing new or changed
+
+    new = orders.tail(3).copy()
+    new["orderId"] = ["n1", "n2", "n3"]
+    new["createdAt"] = pd.to_datetime(["2025-04-02", "2024-12-25", "2025-05-01"])
+    stats = store.upsert(new)
+    assert (stats["new"], stats["earliest"]) == (3, "2024-12-25")
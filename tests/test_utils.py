@@ -0,0 +1,69 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.utils import (
+    clean_phone_number, clean_phone_numbers, contact_columns, format_brl, format_brl_values, relative_date,
+    relative_dates,
+)
+
+AMOUNTS = [
+    0, 0.4, 0.5, 1.5, 2.5, 7, 999, 999.4, 999.5, 1000, 1000.49, 1001, 12_345.5, 999_999.5, 1_000_000, 1e9 + 0.5,
+    -0.4, -0.5, -1.5, -999, -999.5, -1000, -1000.5, -1_234_567.89,
+]
+
+
+@pytest.mark.parametrize("value", AMOUNTS)
+def test_format_brl_values_matches_scalar(value):
+    assert format_brl_values(pd.Series([value])).iloc[0] == format_brl(value)
+
+
+def test_format_brl_values_blank_for_missing_and_keeps_index():
+    out = format_brl_values(pd.Series([1500.0, math.nan, -2.0], index=[10, 20, 30]))
+    assert out.to_dict() == {10: "R$ 1.500", 20: "", 30: "R$ -2"}
+    assert list(format_brl_values(np.array(AMOUNTS))) == [format_brl(v) for v in AMOUNTS]
+
+
+# Days before "today": both sides of 1/31/365, .5-month rounding (45, 75, 105 days; 380 = 1 y + 15 d), future dates
+DAYS = [-5, -1, 0, 1, 2, 30, 31, 32, 44, 45, 46, 75, 105, 135, 364, 365, 366, 379, 380, 381, 395, 410, 729, 730, 745, 1100]
+
+
+@pytest.mark.parametrize("days", DAYS)
+def test_relative_dates_matches_scalar(days):
+    today = pd.Timestamp.today()
+    # An hour earlier, so the scalar call (which reads the clock a bit later) sees the same whole days
+    date = today - pd.Timedelta(days=days, hours=1)
+    assert relative_dates(pd.Series([date]), today=today).iloc[0] == relative_date(date)
+
+
+def test_relative_dates_blank_for_missing():
+    today = pd.Timestamp("2025-06-30")
+    out = relative_dates(pd.Series([pd.NaT, None, "2025-06-29"]), today=today)
+    assert list(out) == ["", "", "1 dia"]
+    assert relative_date(pd.NaT) == ""
+
+
+PHONES = [
+    "(11) 98765-4321", "11987654321", "1187654321", "11887654321", "+55 11 98765-4321", "5511987654321",
+    "12345", "abc", "", " ", None, math.nan, 0, 11987654321, 1187654321, 11987654321.0, "11 9876-54321",
+    "٠١١٩٨٧٦٥٤٣٢", "21 3333-4444 ramal 2",
+]
+
+
+@pytest.mark.parametrize("phone", PHONES)
+def test_clean_phone_numbers_matches_scalar(phone):
+    assert clean_phone_numbers([phone]).iloc[0] == clean_phone_number(phone)
+
+
+def test_contact_columns_first_valid_number():
+    df = pd.DataFrame({
+        "whatsapp": ["", "123", None, "(21) 99999-0000"],
+        "telefone": ["11987654321", "1133334444", None, "11987654321"],
+        "mobile": ["21988887777", None, "junk", None],
+    }, index=[5, 6, 7, 8])
+    out = contact_columns(df)
+
+    for i, row in df.iterrows():
+        phone = next((p for p in map(clean_phone_number, row) if p), None)
+        assert out.at[i, "whatsapp"] == phone
+        assert out.at[i, "whatsapp_link"] == (f"https://wa.me/{phone[1:]}" if phone else None)